@@ -0,0 +1,179 @@
+import os
+import re
+
+from files import (
+    fileHash,
+    fileCopy,
+    fileRemove,
+    dirExists,
+    dirMake,
+    dirNm,
+    readJson,
+    writeJson,
+    writeIfChanged,
+    textHash,
+)
+
+
+ASSET_KINDS = ("css", "js", "images")
+"""The folders of the dist tree with assets that get fingerprinted copies."""
+
+HASH_LENGTH = 10
+
+FINGERPRINT_RE = re.compile(rf"""^(.+)\.([0-9a-f]{{{HASH_LENGTH}}})(\.[^.]+)$""")
+
+COMPRESSED = (".gz", ".br")
+
+
+def keepFingerprinted(name, srcNames):
+    """Whether a file is a fingerprinted copy of one of the source files.
+
+    Pass this as the `keep` argument of `files.dirUpdate()` when syncing the asset
+    folders, so that the sync does not delete the fingerprinted copies.
+    """
+    match = FINGERPRINT_RE.match(name)
+    return bool(match) and f"{match.group(1)}{match.group(3)}" in srcNames
+
+
+class Assets:
+    """Fingerprinted copies of the assets in the dist tree.
+
+    Next to an asset such as `css/style.css` we put a copy whose name contains
+    a hash of its content, such as `css/style.3f2a9c1d0e.css`.
+    Such a file never changes, so browsers and caches may keep it as long as they
+    want. When the asset changes, its copy gets a new name, and the pages refer
+    to the new name straight away.
+
+    The manifest maps the URLs of the assets to the URLs of their copies.
+    Templates and partials translate URLs by means of the Handlebars helper
+    `asset`:
+
+    ```
+    <link href="{{asset "/css/style.css"}}" rel="stylesheet">
+    ```
+
+    See `render.Renderer`.
+
+    When an asset changes, the copy with the old name is not removed straight
+    away: pages that browsers and caches still keep may refer to it.
+    We remember the copies of a number of earlier versions of the assets
+    (generations), and remove a copy when it is not in any of them anymore.
+    """
+
+    def __init__(self, dataOutDir, historyPath=None, generations=2, kinds=ASSET_KINDS):
+        """Set up the fingerprinting.
+
+        Parameters
+        ----------
+        dataOutDir: string
+            The dist tree.
+        historyPath: string, optional None
+            The file where we remember the copies of earlier generations.
+            If None, copies are removed as soon as they are outdated.
+        generations: integer, optional 2
+            The number of earlier generations whose copies are kept.
+        kinds: iterable of string, optional `ASSET_KINDS`
+            The folders of the dist tree with assets.
+        """
+        self.dataOutDir = dataOutDir
+        self.historyPath = historyPath
+        self.generations = generations
+        self.kinds = kinds
+        self.manifest = {}
+        self.history = (
+            []
+            if historyPath is None
+            else readJson(asFile=historyPath, plain=True).get("generations", [])
+        )
+
+    def run(self, log=None):
+        """Makes the fingerprinted copies and the manifest.
+
+        Copies that are not in the current generation nor in one of the earlier
+        generations that we keep, are removed.
+
+        Parameters
+        ----------
+        log: function, optional None
+            If given, it is called for every copy that is made and every
+            outdated copy that is removed, see `instrument.Phase.log()`.
+
+        Returns
+        -------
+        tuple
+            The number of assets and the number of new copies.
+        """
+        dataOutDir = self.dataOutDir
+        manifest = self.manifest
+        current = set()
+        copies = []
+        new = 0
+
+        for kind in self.kinds:
+            kindDir = f"{dataOutDir}/{kind}"
+
+            if not dirExists(kindDir):
+                continue
+
+            for dirPath, dirNames, fileNames in os.walk(kindDir):
+                for name in sorted(fileNames):
+                    if name.endswith(COMPRESSED):
+                        continue
+
+                    if FINGERPRINT_RE.match(name):
+                        copies.append(f"{dirPath}/{name}")
+                        continue
+
+                    path = f"{dirPath}/{name}"
+                    (stem, ext) = os.path.splitext(name)
+                    digest = fileHash(path)[0:HASH_LENGTH]
+                    fpName = f"{stem}.{digest}{ext}"
+                    fpPath = f"{dirPath}/{fpName}"
+
+                    if not os.path.exists(fpPath):
+                        # a plain copy: a hard link would change along with
+                        # the original
+                        fileCopy(path, fpPath)
+                        new += 1
+
+                        if log is not None:
+                            log("copy", fpPath, os.path.getsize(fpPath))
+
+                    url = "/" + os.path.relpath(path, dataOutDir)
+                    fpUrl = "/" + os.path.relpath(fpPath, dataOutDir)
+                    manifest[url] = fpUrl
+                    current.add(fpUrl)
+
+        history = self.history
+
+        if not history or set(history[-1]) != current:
+            history.append(sorted(current))
+
+        del history[0 : -(self.generations + 1)]
+        kept = set().union(*history)
+
+        for path in copies:
+            if "/" + os.path.relpath(path, dataOutDir) not in kept:
+                fileRemove(path)
+
+                if log is not None:
+                    log("delete", path, 0)
+
+        return (len(manifest), new)
+
+    @property
+    def key(self):
+        """A hash of the manifest, for the dependency graph of the pages."""
+        return textHash(writeJson(dict(sorted(self.manifest.items()))))
+
+    def save(self, path):
+        """Writes the manifest as a JSON file, if it has changed.
+
+        The generations are written to the history file.
+        """
+        writeIfChanged(path, writeJson(self.manifest))
+        historyPath = self.historyPath
+
+        if historyPath is not None:
+            dirMake(dirNm(historyPath))
+            writeIfChanged(historyPath, writeJson(dict(generations=self.history)))
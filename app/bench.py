@@ -0,0 +1,350 @@
+"""Benchmarks of the build on synthetic exports.
+
+We generate synthetic exports of the Pure3D database and file area,
+in a few sizes, and time the phases of a build of each of them.
+
+Every run is appended as a JSON line to `_local/bench/results.jsonl`,
+together with the commit of the code, so that the effect of a change can be
+measured by comparing the results of two commits.
+
+Usage:
+
+```
+python bench.py run [--sizes 10,1000] [--versions 3] [--jobs N]
+python bench.py compare [COMMIT COMMIT]
+```
+
+Each size is built twice: a `cold` build into an empty dist tree, and
+a `warm` build right after it, without changes in the export.
+"""
+
+import sys
+import json
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from random import Random
+
+from files import (
+    dirMake,
+    dirNm,
+    abspath,
+    initTree,
+    fileExists,
+    writeJson,
+)
+from helpers import console, run
+from build import Build
+
+
+SIZES = dict(small=10, medium=1000, large=50000)
+"""Named sizes of the synthetic export, in number of editions."""
+
+RESULTS_FILE = "results.jsonl"
+
+WORDS = """
+    model scene castle church bridge harbour statue tomb mosaic ruin temple
+    wall gate tower fresco altar coin vase mill palace reconstruction survey
+""".strip().split()
+
+
+def _oid(rng):
+    return {"$oid": "".join(rng.choice("0123456789abcdef") for i in range(24))}
+
+
+def _text(rng, n):
+    return " ".join(rng.choice(WORDS) for i in range(n))
+
+
+def _markdown(rng):
+    paras = [_text(rng, 40) for i in range(rng.randint(1, 4))]
+    paras[0] = f"**{rng.choice(WORDS)}** {paras[0]} *{rng.choice(WORDS)}*"
+    return "\n\n".join(paras)
+
+
+def _dc(rng):
+    return dict(
+        title=_text(rng, 4).capitalize(),
+        abstract=_markdown(rng),
+        description=_markdown(rng),
+        provenance=[_markdown(rng) for i in range(2)],
+        creator=[_text(rng, 2).title() for i in range(rng.randint(1, 3))],
+        contributor=[_text(rng, 2).title()],
+        institution=_text(rng, 3).title(),
+        place=[_text(rng, 1).title()],
+        period=_text(rng, 1),
+        subject=[rng.choice(WORDS) for i in range(3)],
+        rights=dict(license="CC-BY 4.0", holder=_text(rng, 2).title()),
+    )
+
+
+def makeExport(
+    dataIn,
+    nEditions,
+    perProject=10,
+    viewers=("voyager",),
+    nVersions=3,
+    nModels=2,
+    modelSize=10000,
+    seed=1,
+):
+    """Generates a synthetic export of the Pure3D database and file area.
+
+    Parameters
+    ----------
+    dataIn: string
+        The directory that receives the export.
+        It will be cleared first.
+    nEditions: integer
+        The number of editions.
+    perProject: integer, optional 10
+        The number of editions per project.
+    viewers: iterable of string, optional ("voyager",)
+        The viewers that are installed.
+    nVersions: integer, optional 3
+        The number of installed versions per viewer.
+    nModels: integer, optional 2
+        The number of model files per edition.
+    modelSize: integer, optional 10000
+        The size of a model file in bytes.
+    seed: integer, optional 1
+        The seed of the random generator, so that exports are reproducible.
+    """
+    rng = Random(seed)
+    initTree(dataIn, fresh=True)
+    dbDir = f"{dataIn}/db/json"
+    filesDir = f"{dataIn}/files/project"
+    dirMake(dbDir)
+
+    site = [dict(_id=_oid(rng), dc=_dc(rng))]
+    projects = []
+    editions = []
+
+    nProjects = max(1, (nEditions + perProject - 1) // perProject)
+
+    for p in range(nProjects):
+        pId = _oid(rng)
+        projects.append(
+            dict(_id=pId, title=_text(rng, 3).title(), isVisible=True, dc=_dc(rng))
+        )
+
+    for e in range(nEditions):
+        pId = projects[e % nProjects]["_id"]
+        eId = _oid(rng)
+        sceneFile = "scene.svx.json"
+        editions.append(
+            dict(
+                _id=eId,
+                projectId=pId,
+                title=_text(rng, 4).title(),
+                isPublished=True,
+                dc=_dc(rng),
+                settings=dict(
+                    authorTool=dict(name=viewers[0], sceneFile=sceneFile)
+                ),
+            )
+        )
+        eDir = f"{filesDir}/{pId['$oid']}/edition/{eId['$oid']}"
+        dirMake(f"{eDir}/models")
+        writeJson(dict(asset=dict(version="1.0")), asFile=f"{eDir}/{sceneFile}")
+
+        for m in range(nModels):
+            with open(f"{eDir}/models/model{m}.glb", "wb") as fh:
+                fh.write(rng.randbytes(modelSize))
+
+    for kind, data in (("site", site), ("project", projects), ("edition", editions)):
+        writeJson(data, asFile=f"{dbDir}/{kind}.json")
+
+    for viewer in viewers:
+        for v in range(nVersions):
+            vDir = f"{dataIn}/viewers/{viewer}/0.{36 - v}.0"
+            dirMake(f"{vDir}/js")
+
+            with open(f"{vDir}/js/{viewer}.min.js", "w") as fh:
+                fh.write(f"/* {viewer} {v} */\n" + "x" * 1000)
+
+
+def commitInfo(baseDir):
+    """The current commit and whether the working tree has changes."""
+    (good, commit, stdErr) = run("git rev-parse --short HEAD", workDir=baseDir)
+    (good2, status, stdErr) = run("git status --porcelain", workDir=baseDir)
+    return (commit if good else None, bool(status) if good2 else None)
+
+
+def benchSize(benchDir, name, nEditions, nVersions, jobs):
+    """Generates an export of a certain size and builds it twice.
+
+    Returns
+    -------
+    list of dict
+        The results of the cold and the warm build.
+    """
+    sizeDir = f"{benchDir}/{name}"
+    dataIn = f"{sizeDir}/input"
+    dataOut = f"{sizeDir}/dist"
+
+    console(f"Generating export with {nEditions} editions in {dataIn}")
+    makeExport(dataIn, nEditions, nVersions=nVersions)
+    initTree(dataOut, fresh=True)
+    initTree(f"{sizeDir}/build", fresh=True)
+    initTree(f"{sizeDir}/cache", fresh=True)
+
+    overrides = dict(
+        dataIn=dataIn,
+        dataOut=dataOut,
+        viewers=f"{dataIn}/viewers",
+        cssOut=f"{dataOut}/css/style.css",
+        buildDir=f"{sizeDir}/build",
+        cacheDir=f"{sizeDir}/cache",
+    )
+
+    results = []
+
+    for mode in ("cold", "warm"):
+        console(f"Building {name} ({mode})")
+        B = Build(jobs=jobs, overrides=overrides)
+        good = B.build()
+        report = B.instrument.report()
+        results.append(
+            dict(
+                size=name,
+                editions=nEditions,
+                versions=nVersions,
+                jobs=jobs,
+                mode=mode,
+                good=good,
+                wall=report["wall"],
+                phases=report["phases"],
+            )
+        )
+
+    return results
+
+
+def runBench(sizes, nVersions=3, jobs=None):
+    """Runs the benchmark for a number of sizes and stores the results."""
+    baseDir = dirNm(dirNm(abspath(__file__)))
+    benchDir = f"{baseDir}/_local/bench"
+    resultsFile = f"{benchDir}/{RESULTS_FILE}"
+    (commit, dirty) = commitInfo(baseDir)
+    date = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+    dirMake(benchDir)
+
+    for size in sizes:
+        (name, nEditions) = (
+            (size, SIZES[size]) if size in SIZES else (f"n{size}", int(size))
+        )
+
+        for result in benchSize(benchDir, name, nEditions, nVersions, jobs):
+            result = dict(commit=commit, dirty=dirty, date=date, **result)
+
+            with open(resultsFile, "a") as fh:
+                fh.write(json.dumps(result) + "\n")
+
+            showResult(result)
+
+
+def showResult(result):
+    console(
+        f"{result['commit']}{'+' if result['dirty'] else ''} {result['size']} "
+        f"({result['editions']} editions x {result['versions']} versions, "
+        f"jobs={result['jobs']}) {result['mode']}: {result['wall']:.2f}s"
+    )
+
+    for ph in result["phases"]:
+        console(
+            f"    {ph['name']:<28} {ph['wall']:>8.3f}s wall {ph['cpu']:>8.3f}s cpu "
+            f"{ph['files']:>7} files {ph['bytes'] / 1e6:>9.1f} MB"
+        )
+
+
+def compareBench(commits):
+    """Compares the latest results of two commits, phase by phase.
+
+    Parameters
+    ----------
+    commits: list of string
+        The two commits to compare. If empty, the last two commits with results
+        are compared.
+    """
+    baseDir = dirNm(dirNm(abspath(__file__)))
+    resultsFile = f"{baseDir}/_local/bench/{RESULTS_FILE}"
+
+    if not fileExists(resultsFile):
+        console(f"No results in {resultsFile}", error=True)
+        return False
+
+    latest = {}
+    order = []
+
+    with open(resultsFile) as fh:
+        for line in fh:
+            result = json.loads(line)
+            commit = result["commit"]
+
+            if commit not in order:
+                order.append(commit)
+
+            key = (result["size"], result["versions"], result["jobs"], result["mode"])
+            latest.setdefault(commit, {})[key] = result
+
+    if not commits:
+        commits = order[-2:]
+
+    if len(commits) != 2 or any(c not in latest for c in commits):
+        console(f"Cannot compare {commits}; results exist for {order}", error=True)
+        return False
+
+    (old, new) = commits
+
+    for key in sorted(set(latest[old]) & set(latest[new])):
+        (size, versions, jobs, mode) = key
+        oldPhases = {ph["name"]: ph for ph in latest[old][key]["phases"]}
+        newPhases = {ph["name"]: ph for ph in latest[new][key]["phases"]}
+        console(f"{size} x {versions} versions jobs={jobs} {mode}: {old} => {new}")
+
+        for name, newPh in newPhases.items():
+            oldPh = oldPhases.get(name, None)
+
+            if oldPh is None:
+                continue
+
+            (o, n) = (oldPh["wall"], newPh["wall"])
+            ratio = f"{n / o:>6.2f}x" if o else "      -"
+            console(f"    {name:<28} {o:>8.3f}s => {n:>8.3f}s {ratio}")
+
+    return True
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark the build on synthetic exports")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    runParser = sub.add_parser("run", help="run the benchmark")
+    runParser.add_argument(
+        "--sizes",
+        default="small,medium",
+        help=(
+            "comma separated sizes: numbers of editions or "
+            f"one of {', '.join(SIZES)}"
+        ),
+    )
+    runParser.add_argument(
+        "--versions", type=int, default=3, help="number of viewer versions"
+    )
+    runParser.add_argument("--jobs", type=int, default=None, help="render workers")
+
+    compareParser = sub.add_parser("compare", help="compare the results of commits")
+    compareParser.add_argument("commits", nargs="*", help="two commits")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        runBench(args.sizes.split(","), nVersions=args.versions, jobs=args.jobs)
+        return 0
+
+    return 0 if compareBench(args.commits) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
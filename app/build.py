@@ -1,40 +1,88 @@
 import sys
-import re
-from copy import deepcopy
+import json
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
 
-from pybars import Compiler
-from markdown import markdown
 
 from files import (
     dirContents,
     dirUpdate,
     dirNm,
     dirMake,
-    baseNm,
-    stripExt,
     abspath,
-    writeYaml,
     readYaml,
     readJson,
     writeJson,
+    writeIfChanged,
     initTree,
-    dirAllFiles,
+    textHash,
+    fileExists,
+    fileRemove,
+    getSize,
+    JsonRecords,
+    Manifest,
+    COPY_STRATEGIES,
     expanduser as ex,
 )
-from generic import AttrDict, deepAttrDict, deepdict
-from helpers import console, prettify, dottedKey, genViewerSelector
+from generic import AttrDict, deepdict
+from helpers import console, prettify, dottedKey, ViewerSelector
 from tailwind import Tailwind
+from depgraph import DepGraph
+from records import Project, Edition, EditionVariant
+from idmap import IdMap
+from compress import Precompressor
+from assets import Assets, keepFingerprinted, ASSET_KINDS
+from mdcache import MarkdownCache
+from instrument import Instrument
+from render import Renderer, initWorker, renderParallel
+from delta import Delta
 
 
-COMMENT_RE = re.compile(r"""\{\{!--.*?--}}""", re.S)
-
 CONFIG_FILE = "config.yaml"
 FEATURED_FILE = "featured.yaml"
 TAILWIND_CFG = "tailwind.config.js"
+GRAPH_FILE = "graph.json"
+MANIFEST_FILE = "manifest.json"
+IDMAP_FILE = "ids.json"
+COMPRESS_FILE = "compress.json"
+ASSETS_FILE = "assets.json"
+ASSET_HISTORY_FILE = "asset-history.json"
+VIEWERS_FILE = "viewers.json"
+DELTA_FILE = "delta.json"
+DELTA_INDEX_FILE = "dist.json"
+PROFILE_FILE = "profile.json"
 
 
 class Build:
-    def __init__(self):
+    def __init__(
+        self, full=False, jobs=None, trace=None, overrides=None, debugData=None
+    ):
+        """Prepare a build of the static site.
+
+        Parameters
+        ----------
+        full: boolean, optional False
+            If True, all pages will be rendered, even if the build graph of
+            the previous build tells that they have not changed.
+        jobs: integer, optional None
+            The number of worker processes that render pages in parallel.
+            If None, it is taken from the build settings in the config file.
+            If there is just one job, pages are rendered in the main process.
+        trace: string, optional None
+            If given, a trace of the phases of the build is written to this file,
+            in the Chrome trace event format.
+            A JSON report of the phases is always written.
+        overrides: dict, optional None
+            Locations that override the ones in the config file, such as
+            `dataIn` and `dataOut`.
+            Besides the locations in the config file, you can override
+            `buildDir`, where the state of the build (graph, manifest, profile,
+            delta) is kept, and `cacheDir`, where the compiled templates and the
+            converted markdown are kept.
+        debugData: string, optional None
+            Overrides `build.debugData` in the config file: `yaml`, `jsonl`,
+            or `off`.
+        """
         baseDir = dirNm(dirNm(abspath(__file__)))
         localDir = f"{baseDir}/_local"
 
@@ -43,14 +91,26 @@ class Build:
         featured = readYaml(asFile=featuredFile)
         cfg = readYaml(asFile=cfgFile)
 
+        if debugData is not None:
+            cfg.build.debugData = None if debugData == "off" else debugData
+
         self.cfg = cfg
         self.featured = featured
+        self.full = full
+        self.jobs = jobs
+        self.trace = trace
+        self.instrument = Instrument()
+        self.cfgKey = textHash(writeJson(dict(cfg=cfg, featured=featured)))
 
         locations = cfg.locations
         self.locations = locations
+        locations.buildDir = f"{localDir}/build"
+        locations.cacheDir = f"{localDir}/cache"
 
         self.markdownKeys = set(cfg.markdown.keys)
+        mdCacheSettings = cfg.markdown.cache or AttrDict()
         self.listKeys = set(cfg.list.keys)
+        self.editionVariants = (cfg.build or AttrDict()).editionVariants is not False
 
         for k, v in locations.items():
             v = v.replace("«base»", baseDir)
@@ -59,7 +119,14 @@ class Build:
         locations.baseDir = baseDir
         locations.localDir = localDir
 
-        self.Handlebars = Compiler()
+        if overrides is not None:
+            for k, v in overrides.items():
+                locations[k] = ex(v)
+
+        self.markdown = MarkdownCache(
+            cacheDir=locations.cacheDir if mdCacheSettings.disk else None,
+            size=mdCacheSettings.size or 10000,
+        )
 
         initTree(locations.dataIn, fresh=False)
 
@@ -68,16 +135,27 @@ class Build:
         self.T = T
 
         self.rawData = AttrDict()
+        self.index = None
         self.data = AttrDict()
 
-    def getRawData(self):
+    def getRawData(self, log=None):
         """Get the raw data contained in the json export from Mongo DB.
 
         This is the metadata of the site, the projects, and the editions.
         We store them as is in member `rawData`.
 
+        If `build.streamExport` is set in the config, the editions are not loaded
+        into memory, but scanned once and read back when needed,
+        project by project, see `files.JsonRecords`.
+
         Later we distil page data from this, i.e. the data that is ready to fill
         in the variables of the templates.
+
+        Parameters
+        ----------
+        log: function, optional None
+            If given, it is called for every file that is read,
+            see `instrument.Phase.log()`.
         """
         rawData = self.rawData
 
@@ -85,8 +163,121 @@ class Build:
         dataInDir = locations.dataIn
         dbDir = f"{dataInDir}/db/json"
 
+        streamExport = self.cfg.build.streamExport
+
         for kind in ("site", "project", "edition"):
-            rawData[kind] = readJson(asFile=f"{dbDir}/{kind}.json")
+            path = f"{dbDir}/{kind}.json"
+            rawData[kind] = (
+                JsonRecords(path, groupBy=("projectId", "$oid"))
+                if streamExport and kind == "edition"
+                else readJson(asFile=path)
+            )
+
+            if log is not None and fileExists(path):
+                log("read", path, getSize(path))
+
+    def makeIndex(self):
+        """Builds the index of projects and editions.
+
+        All targets need the projects and editions, with their numbers in the
+        output tree and their metadata translated into HTML.
+        We compute that once, right after `getRawData()`, and store it in member
+        `index`:
+
+        *   `projects`: the entries of the projects, in export order;
+        *   `editions`: the entries of the editions, in export order;
+        *   `editionsByProject`: lists of entries of editions by project id.
+
+        See `projectEntry()` and `editionEntry()` for the members of the entries.
+
+        If the editions are streamed from the export (`build.streamExport`),
+        we do not keep their entries, but compute them again when they are needed,
+        see `getEditions()`.
+        """
+        rawData = self.rawData
+        streamed = isinstance(rawData.edition, JsonRecords)
+
+        index = AttrDict()
+        index.streamed = streamed
+        index.projects = [self.projectEntry(pItem) for pItem in rawData.project]
+        index.editions = (
+            [] if streamed else [self.editionEntry(eItem) for eItem in rawData.edition]
+        )
+        editionsByProject = {}
+
+        for e in index.editions:
+            editionsByProject.setdefault(e.projectId, []).append(e)
+
+        index.editionsByProject = editionsByProject
+
+        self.index = index
+
+    def projectEntry(self, pItem):
+        """The index entry of a raw project record.
+
+        Returns
+        -------
+        AttrDict
+            With members `id`, `num` (the number in the output tree), `item`
+            (the raw record), and `dc` (the htmlified metadata).
+        """
+        pId = pItem._id["$oid"]
+        return AttrDict(
+            id=pId, num=self.pMap.get(pId, pId), item=pItem, dc=self.htmlify(pItem.dc)
+        )
+
+    def editionEntry(self, eItem):
+        """The index entry of a raw edition record.
+
+        Returns
+        -------
+        AttrDict
+            With members `id`, `num`, `projectId`, `projectNum`, `item`, and `dc`,
+            as in `projectEntry()`.
+        """
+        eId = eItem._id["$oid"]
+        pId = eItem.projectId["$oid"]
+        return AttrDict(
+            id=eId,
+            num=self.eMap.get(pId, {}).get(eId, eId),
+            projectId=pId,
+            projectNum=self.pMap.get(pId, pId),
+            item=eItem,
+            dc=self.htmlify(eItem.dc),
+        )
+
+    def getEditions(self, pId=None):
+        """The index entries of the editions, of all projects or of one project.
+
+        Parameters
+        ----------
+        pId: string, optional None
+            The id of a project. If None, the editions of all projects are given.
+
+        Returns
+        -------
+        iterable
+            The index entries, in export order.
+        """
+        index = self.index
+
+        if index.streamed:
+            eInfo = self.rawData.edition
+            eItems = eInfo if pId is None else eInfo.group(pId)
+            return (self.editionEntry(eItem) for eItem in eItems)
+
+        return (
+            index.editions if pId is None else index.editionsByProject.get(pId, [])
+        )
+
+    def writeViewerManifest(self, path):
+        """Writes the installed viewers and their versions as a JSON file.
+
+        With `build.editionVariants` switched off there is only one page per
+        edition, and the browser reads this file to let the user choose a viewer
+        and a version.
+        """
+        writeIfChanged(path, writeJson(dict(viewers=self.getData("viewers"))))
 
     def htmlify(self, info):
         """Translate fields in a dict into html.
@@ -114,6 +305,7 @@ class Build:
         """
         listKeys = self.listKeys
         markdownKeys = self.markdownKeys
+        markdown = self.markdown
 
         r = AttrDict()
 
@@ -141,7 +333,7 @@ class Build:
 
         return r
 
-    def getData(self, kind):
+    def getData(self, kind, stream=False):
         """Prepares page data of a certain kind.
 
         Pages are generated by filling in templates and partials on the basis of
@@ -154,20 +346,22 @@ class Build:
         ----------
         kind: string
             The kind of data we need to prepare.
+        stream: boolean, optional False
+            If True, the data is not gathered in a list, but produced item by item,
+            and it is not stored. Use this for data that is needed only once,
+            such as the data for the pages of a target.
 
         Returns
         -------
-        dict or array
+        list or iterator
             The data itself.
-            It is also stored in the member `data` of this object, under key
-            `kind`. It will not be computed twice.
+            If not streamed, it is also stored in the member `data` of this
+            object, under key `kind`. It will not be computed twice.
         """
         cfg = self.cfg
         generation = cfg.generation
         rawData = self.rawData
         data = self.data
-        pMap = self.pMap
-        eMap = self.eMap
 
         if kind in data:
             return data[kind]
@@ -180,35 +374,29 @@ class Build:
             defaultViewer = viewerSettings.default
             defaultVersion = viewerSettings[defaultViewer].defaultVersion
 
-            result = []
-
             for viewer in dirContents(viewerDir)[1]:
                 theseSettings = viewerSettings[viewer] or AttrDict()
                 element = theseSettings.element or viewer
                 isDefault = viewer == defaultViewer
 
-                result.append(
-                    AttrDict(
-                        name=viewer,
-                        element=element,
-                        isDefault=isDefault,
-                        versions=[
-                            AttrDict(
-                                name=version,
-                                isDefault=isDefault and version == defaultVersion,
+                yield AttrDict(
+                    name=viewer,
+                    element=element,
+                    isDefault=isDefault,
+                    versions=[
+                        AttrDict(
+                            name=version,
+                            isDefault=isDefault and version == defaultVersion,
+                        )
+                        for version in reversed(
+                            sorted(
+                                dirContents(f"{viewerDir}/{viewer}")[1],
+                                key=dottedKey,
                             )
-                            for version in reversed(
-                                sorted(
-                                    dirContents(f"{viewerDir}/{viewer}")[1],
-                                    key=dottedKey,
-                                )
-                            )
-                        ],
-                    )
+                        )
+                    ],
                 )
 
-            return result
-
         def get_textpages():
             textDir = cfg.locations.texts
             textFiles = dirContents(textDir)[0]
@@ -220,8 +408,6 @@ class Build:
                     if t != textFile
                 ]
 
-            result = []
-
             for textFile in textFiles:
                 r = AttrDict()
                 r.template = "p3d-text.html"
@@ -233,9 +419,7 @@ class Build:
                 with open(f"{textDir}/{textFile}") as fh:
                     r.content = fh.read()
 
-                result.append(r)
-
-            return result
+                yield r
 
         def get_site():
             featured = self.featured
@@ -253,7 +437,7 @@ class Build:
             projectsIndex = {str(p.num): p for p in projects}
             projectsFeatured = []
 
-            for p in featured.projects:
+            for p in featured.projects or ():
                 p = str(p)
                 if p not in projectsIndex:
                     console(f"WARNING: featured project {p} does not exist")
@@ -263,7 +447,7 @@ class Build:
 
             r.projects = projectsFeatured
 
-            return [r]
+            yield r
 
         def get_projects():
             r = AttrDict()
@@ -273,7 +457,7 @@ class Build:
             r.fileName = "projects.html"
             r.projects = self.getData("project")
 
-            return [r]
+            yield r
 
         def get_editions():
             r = AttrDict()
@@ -283,19 +467,15 @@ class Build:
             r.fileName = "editions.html"
             r.editions = self.getData("edition")
 
-            return [r]
+            yield r
 
         def get_project():
-            info = rawData[kind]
-
-            result = []
+            for p in self.index.projects:
+                item = p.item
+                itemNo = p.num
+                dc = p.dc
 
-            for item in info:
-                itemId = item._id["$oid"]
-                itemNo = pMap.get(itemId, itemId)
-                dc = self.htmlify(item.dc)
-
-                r = AttrDict()
+                r = Project()
                 r.name = item.title
                 r.num = itemNo
                 r.fileName = f"project/{itemNo}/index.html"
@@ -303,23 +483,16 @@ class Build:
                 r.abstract = dc.abstract
                 r.subjects = dc.subject
                 r.visible = item.isVisible
-                result.append(r)
-
-            return result
+                yield r
 
         def get_edition():
-            info = rawData[kind]
-
-            result = []
-
-            for item in info:
-                itemId = item._id["$oid"]
-                itemProjectId = item.projectId["$oid"]
-                itemProjectNo = pMap.get(itemProjectId, itemProjectId)
-                itemNo = eMap.get(itemProjectId, {}).get(itemId, itemId)
-                dc = self.htmlify(item.dc)
+            for e in self.getEditions():
+                item = e.item
+                itemProjectNo = e.projectNum
+                itemNo = e.num
+                dc = e.dc
 
-                r = AttrDict()
+                r = Edition()
                 r.projectNum = itemProjectNo
                 r.projectFileName = f"project/{itemProjectNo}.html"
                 r.name = item.title
@@ -329,29 +502,16 @@ class Build:
                 r.description = dc.description
                 r.subjects = dc.subject
                 r.published = item.isPublished
-                result.append(r)
-
-            return result
+                yield r
 
         def get_projectpages():
-            pInfo = rawData["project"]
-            eInfo = rawData["edition"]
-
-            editionByProject = {}
-
-            for eItem in eInfo:
-                pId = eItem.projectId["$oid"]
-                editionByProject.setdefault(pId, []).append(eItem)
-
-            result = []
-
-            for pItem in pInfo:
-                pId = pItem._id["$oid"]
-                pNo = pMap.get(pId, pId)
-                pdc = self.htmlify(pItem.dc)
+            for p in self.index.projects:
+                pItem = p.item
+                pNo = p.num
+                pdc = p.dc
                 fileName = f"project/{pNo}/index.html"
 
-                pr = AttrDict()
+                pr = Project()
                 pr.template = "p3d-project.html"
                 pr.fileName = fileName
                 pr.num = pNo
@@ -360,12 +520,12 @@ class Build:
                 pr.contentdata = pdc
                 pr.editions = []
 
-                for eItem in editionByProject.get(pId, []):
-                    eId = eItem._id["$oid"]
-                    eNo = eMap.get(pId, {}).get(eId, eId)
-                    edc = self.htmlify(eItem.dc)
+                for e in self.getEditions(p.id):
+                    eItem = e.item
+                    eNo = e.num
+                    edc = e.dc
 
-                    er = AttrDict()
+                    er = Edition()
                     er.projectNum = pNo
                     er.projectFileName = f"project/{pNo}/index.html"
                     er.fileName = f"project/{pNo}/edition/{eNo}/index.html"
@@ -376,9 +536,7 @@ class Build:
 
                     pr.editions.append(er)
 
-                result.append(pr)
-
-            return result
+                yield pr
 
         def get_editionpages():
             viewers = self.getData("viewers")
@@ -390,30 +548,26 @@ class Build:
                 )
                 for vw in viewers
             )
+            genViewerSelector = ViewerSelector(viewersLean)
+            singlePage = not self.editionVariants
+            variants = [(vw, vv) for vw in viewers for vv in vw.versions]
+            defaultVariant = next(
+                (v for v in variants if v[1].isDefault),
+                variants[0] if variants else None,
+            )
 
-            pInfo = rawData["project"]
-            eInfo = rawData["edition"]
-
-            editionByProject = {}
-
-            for eItem in eInfo:
-                pId = eItem.projectId["$oid"]
-                editionByProject.setdefault(pId, []).append(eItem)
-
-            result = []
-
-            for pItem in pInfo:
-                pId = pItem._id["$oid"]
-                pNo = pMap.get(pId, pId)
+            for p in self.index.projects:
+                pItem = p.item
+                pNo = p.num
                 projectFileName = f"project/{pNo}/index.html"
                 projectName = pItem.get("title", pNo)
 
-                for eItem in editionByProject.get(pId, []):
-                    eId = eItem._id["$oid"]
-                    eNo = eMap.get(pId, {}).get(eId, eId)
-                    edc = self.htmlify(eItem.dc)
+                for e in self.getEditions(p.id):
+                    eItem = e.item
+                    eNo = e.num
+                    edc = e.dc
 
-                    er = AttrDict()
+                    er = Edition()
                     er.template = "p3d-edition.html"
                     er.projectNum = pNo
                     er.projectName = projectName
@@ -429,6 +583,23 @@ class Build:
                     origVersion = authorTool.name
                     er.sceneFile = authorTool.sceneFile
 
+                    if singlePage:
+                        # the viewer is chosen in the browser, see viewer-switch.js
+                        er.singlePage = True
+                        er.origViewer = origViewer
+                        er.origVersion = origVersion
+
+                        if defaultVariant is not None:
+                            (vw, vv) = defaultVariant
+                            yield EditionVariant(
+                                er,
+                                viewer=vw.name,
+                                version=vv.name,
+                                element=vw.element,
+                                fileName=f"{fileBase}.html",
+                            )
+                        continue
+
                     for viewerInfo in viewers:
                         viewer = viewerInfo.name
                         element = viewerInfo.element
@@ -438,15 +609,9 @@ class Build:
                         for versionInfo in versions:
                             version = versionInfo.name
                             isDefault = versionInfo.isDefault
-                            ver = deepAttrDict(deepcopy(deepdict(er)))
-                            ver.viewer = viewer
-                            ver.version = version
-                            ver.element = element
-                            ver.fileName = f"{fileBase}-{viewer}-{version}.html"
                             isDefault = isDefaultViewer and isDefault
 
                             viewerSelector = genViewerSelector(
-                                viewersLean,
                                 viewer,
                                 version,
                                 origViewer,
@@ -454,20 +619,27 @@ class Build:
                                 fileBase,
                             )
 
-                            ver.viewerSelector = viewerSelector
-                            result.append(ver)
+                            ver = EditionVariant(
+                                er,
+                                viewer=viewer,
+                                version=version,
+                                element=element,
+                                fileName=f"{fileBase}-{viewer}-{version}.html",
+                                viewerSelector=viewerSelector,
+                            )
+                            yield ver
 
                             if isDefault:
-                                ver = deepAttrDict(deepcopy(deepdict(ver)))
-                                ver.fileName = f"{fileBase}.html"
-                                result.append(ver)
-
-            return result
+                                yield EditionVariant(ver, fileName=f"{fileBase}.html")
 
         getFunc = locals().get(f"get_{kind}", None)
 
-        result = getFunc() if getFunc is not None else []
+        items = getFunc() if getFunc is not None else iter(())
+
+        if stream:
+            return items
 
+        result = list(items)
         data[kind] = result
         return result
 
@@ -481,14 +653,116 @@ class Build:
         filesOutDir = f"{dataOutDir}/files"
         projectOutDir = f"{filesOutDir}/project"
         yamlOutDir = f"{dataOutDir}/yaml"
-        Handlebars = self.Handlebars
         partialsIn = locations.partialsIn
         T = self.T
+        buildSettings = self.cfg.build or AttrDict()
+        jobs = self.jobs or buildSettings.jobs or 1
+        streaming = buildSettings.streaming
+
+        debugData = buildSettings.debugData or None
+
+        if debugData not in {None, "yaml", "jsonl"}:
+            console(f"WARNING: unknown debug data format {debugData}, writing none")
+            debugData = None
+
+        renderArgs = (
+            templateDir,
+            partialsIn,
+            dataOutDir,
+            yamlOutDir if debugData == "yaml" else None,
+            locations.cacheDir if buildSettings.templateCache else None,
+        )
+        renderer = Renderer(*renderArgs)
+        pool = []
+
+        assetSettings = self.cfg.assets or AttrDict()
+        assets = (
+            Assets(
+                dataOutDir,
+                historyPath=f"{locations.buildDir}/{ASSET_HISTORY_FILE}",
+                generations=assetSettings.get("generations", 2),
+            )
+            if assetSettings.fingerprint
+            else None
+        )
 
-        partials = {}
-        compiledTemplates = {}
+        def getPool():
+            """Start the worker processes for rendering, if not already started.
 
-        def copyFromExport():
+            Every worker compiles the partials and templates for itself.
+            """
+            if not pool:
+                pool.append(
+                    ProcessPoolExecutor(
+                        max_workers=jobs,
+                        initializer=initWorker,
+                        initargs=(*renderArgs, renderer.assets),
+                    )
+                )
+            return pool[0]
+
+        graph = (
+            DepGraph(
+                f"{locations.buildDir}/{GRAPH_FILE}",
+                dataOutDir,
+                templateDir,
+                partialsIn,
+                self.cfgKey,
+                full=self.full,
+            )
+            if buildSettings.incremental
+            else None
+        )
+
+        manifest = (
+            Manifest(f"{locations.buildDir}/{MANIFEST_FILE}")
+            if buildSettings.sync == "checksum"
+            else None
+        )
+        strategy = buildSettings.copy or "copy"
+
+        if strategy not in COPY_STRATEGIES:
+            console(f"WARNING: unknown copy strategy {strategy}, using copy instead")
+            strategy = "copy"
+
+        compressSettings = self.cfg.compress or AttrDict()
+        compressPath = f"{locations.buildDir}/{COMPRESS_FILE}"
+        precompressor = (
+            Precompressor(
+                compressPath,
+                encodings=compressSettings.encodings or ("gz", "br"),
+                minGain=compressSettings.minGain or 0,
+                minSize=compressSettings.minSize or 0,
+                largeSize=compressSettings.largeSize or 1 << 24,
+            )
+            if compressSettings.enabled
+            else None
+        )
+
+        delta = (
+            Delta(dataOutDir, f"{locations.buildDir}/{DELTA_INDEX_FILE}")
+            if buildSettings.delta
+            else None
+        )
+
+        def deltaCheck(path):
+            if delta is not None:
+                delta.check(path)
+
+        def syncProgress(dstDir, c, d):
+            if c or d:
+                report = f"{c:>3} copied, {d:>3} deleted"
+                console(f"{'synced':<10} {'':<12} {report:<24} in {dstDir}")
+
+        syncOptions = dict(
+            manifest=manifest,
+            strategy=strategy,
+            workers=buildSettings.syncWorkers,
+            progress=syncProgress if buildSettings.syncProgress else None,
+            siblings=() if precompressor is None else precompressor.siblings,
+        )
+
+        def copyFromExport(log):
             """Copies the export data files to the static file area.
 
             The copy is incremental at the levels of projects and editions.
@@ -499,164 +773,189 @@ class Build:
             So if your export contains a single or a few projects and editions,
             they will be used to update the static file area without affecting material
             of the static file area that is outside these projects and editions.
+
+            Projects and editions get numbers that are kept from build to build
+            in a single mapping file, see `idmap.IdMap`.
+            New numbers are saved before anything is copied or deleted: the sync
+            removes the `id.json` files from which older builds made the mapping,
+            and an interrupted build must not lose the numbers.
             """
+            idMap = IdMap(f"{projectOutDir}/{IDMAP_FILE}", projectOutDir)
+            self.pMap = idMap.projects
+            self.eMap = idMap.editions
+
+            projectNums = {
+                pId: idMap.project(pId) for pId in dirContents(projectInDir)[1]
+            }
+            editionNums = {
+                pId: {
+                    eId: idMap.edition(pId, eId)
+                    for eId in dirContents(f"{projectInDir}/{pId}/edition")[1]
+                }
+                for pId in projectNums
+            }
+
+            idMap.save()
+            deltaCheck(idMap.path)
 
             goodOuter, cOuter, dOuter = dirUpdate(
-                filesInDir, filesOutDir, recursive=False
+                filesInDir, filesOutDir, recursive=False, log=log, **syncOptions
             )
             c = cOuter
             d = dOuter
 
-            pMap = {}
-            eMap = {}
-            self.pMap = pMap
-            self.eMap = eMap
-
-            pCount = 0
-
-            for pNum in dirContents(projectOutDir)[1]:
-                pId = readJson(asFile=f"{projectOutDir}/{pNum}/id.json").id
-                pMap[pId] = pNum
-
-            for pId in dirContents(projectInDir)[1]:
-                if pId in pMap:
-                    pNum = pMap[pId]
-                else:
-                    pCount += 1
-                    pNum = pCount
-                    pMap[pId] = pNum
-
+            for pId, pNum in projectNums.items():
                 pInDir = f"{projectInDir}/{pId}"
                 pOutDir = f"{projectOutDir}/{pNum}"
                 goodProject, cProject, dProject = dirUpdate(
-                    pInDir, pOutDir, recursive=False
+                    pInDir, pOutDir, recursive=False, log=log, **syncOptions
                 )
                 c += cProject
                 d += dProject
-                writeJson(dict(id=pId), asFile=f"{projectOutDir}/{pNum}/id.json")
 
                 editionInDir = f"{pInDir}/edition"
                 editionOutDir = f"{pOutDir}/edition"
 
-                eCount = 0
-
-                thisEMap = {}
-
-                for eNum in dirContents(editionOutDir)[1]:
-                    eId = readJson(asFile=f"{editionOutDir}/{eNum}/id.json").id
-                    thisEMap[eId] = eNum
-
-                for eId in dirContents(editionInDir)[1]:
-                    if eId in thisEMap:
-                        eNum = thisEMap[eId]
-                    else:
-                        eCount += 1
-                        eNum = eCount
-                        thisEMap[eId] = eNum
-
+                for eId, eNum in editionNums[pId].items():
                     eInDir = f"{editionInDir}/{eId}"
                     eOutDir = f"{editionOutDir}/{eNum}"
-                    goodEdition, cEdition, dEdition = dirUpdate(eInDir, eOutDir)
+                    goodEdition, cEdition, dEdition = dirUpdate(
+                        eInDir, eOutDir, log=log, **syncOptions
+                    )
                     c += cEdition
                     d += dEdition
-                    writeJson(dict(id=eId), asFile=f"{editionOutDir}/{eNum}/id.json")
-
-                eMap[pId] = thisEMap
 
             report = f"{c:>3} copied, {d:>3} deleted"
             console(f"{'updated':<10} {'data':<12} {report:<24} to {filesOutDir}")
             return goodOuter and goodProject
 
-        def copyStaticFolder(kind):
+        def copyStaticFolder(kind, log):
             srcDir = locations[kind]
             dstDir = f"{dataOutDir}/{kind}"
-            (good, c, d) = dirUpdate(srcDir, dstDir)
+            # only the asset folders get fingerprinted copies that must be kept
+            keep = (
+                keepFingerprinted
+                if assets is not None and kind in ASSET_KINDS
+                else None
+            )
+            (good, c, d) = dirUpdate(srcDir, dstDir, log=log, keep=keep, **syncOptions)
             report = f"{c:>3} copied, {d:>3} deleted"
             console(f"{'updated':<10} {kind:<12} {report:<24} to {dstDir}")
             return good
 
         def registerPartials():
-            good = True
-
-            for partialFile in dirAllFiles(partialsIn):
-                pDir = dirNm(partialFile).replace(partialsIn, "").strip("/")
-                pFile = baseNm(partialFile)
-                pName = stripExt(pFile)
-                sep = "" if pDir == "" else "/"
-                partial = f"{pDir}{sep}{pName}"
+            errors = renderer.registerPartials()
 
-                with open(partialFile) as fh:
-                    pContent = COMMENT_RE.sub("", fh.read())
-
-                try:
-                    partials[partial] = Handlebars.compile(pContent)
-                except Exception as e:
-                    console(f"{partial} : {str(e)}")
-                    good = False
+            for error in errors:
+                console(error)
 
-            report = f"{len(partials):<3} pieces"
+            report = f"{len(renderer.partials):<3} pieces"
             console(f"{'compiled':<10} {'partials':<12} {report:<24} to memory")
-            return good
+            return len(errors) == 0
 
         def genCss():
             """Generate the CSS by means of tailwind."""
-            return T.generate()
+            good = T.generate()
+            deltaCheck(locations.cssOut)
+            return good
+
+        def fingerprintAssets(log):
+            """Make fingerprinted copies of the assets and let the pages use them."""
+            (n, new) = assets.run(log=log)
+            assets.save(f"{dataOutDir}/{ASSETS_FILE}")
+            deltaCheck(f"{dataOutDir}/{ASSETS_FILE}")
+            renderer.assets = assets.manifest
+
+            if graph is not None:
+                graph.addInput(assets.key)
 
-        def genTarget(target):
-            items = self.getData(target)
+            report = f"{n:>3} assets, {new:>3} new"
+            console(f"{'updated':<10} {'assets':<12} {report:<24} in {dataOutDir}")
+
+        def genTarget(target, log):
+            items = self.getData(target, stream=streaming)
 
             success = 0
             failure = 0
+            kept = 0
+            removed = 0
             good = True
+            produced = set()
 
-            for item in items:
-                templateFile = f"{templateDir}/{item.template}"
+            # the page data of a target as JSON lines, also of the kept pages
+            debugPath = f"{yamlOutDir}/{target}.jsonl"
+            debugFh = None
 
-                if templateFile in compiledTemplates:
-                    template = compiledTemplates[templateFile]
-                else:
-                    with open(templateFile) as fh:
-                        tContent = COMMENT_RE.sub("", fh.read())
+            if debugData == "jsonl":
+                dirMake(yamlOutDir)
+                debugFh = open(debugPath, "w", encoding="utf8")
 
-                    try:
-                        template = Handlebars.compile(tContent)
-                    except Exception as e:
-                        console(f"{templateFile} : {str(e)}", error=True)
-                        template = None
+            def needed():
+                nonlocal kept
 
-                    compiledTemplates[templateFile] = template
+                for item in items:
+                    produced.add(item.fileName)
 
-                if template is None:
-                    failure += 1
-                    good = False
-                    continue
+                    if debugFh is not None:
+                        debugFh.write(
+                            json.dumps(deepdict(item), ensure_ascii=False) + "\n"
+                        )
+
+                    if graph is not None:
+                        deps = graph.key(item)
+                        paths = renderer.outPaths(item)
+
+                        if graph.isFresh(item.fileName, deps, paths):
+                            graph.record(target, item.fileName, deps)
+                            kept += 1
+                            continue
+                    else:
+                        deps = None
+
+                    yield (item, deps)
+
+            if jobs > 1:
+                results = renderParallel(getPool(), needed(), jobs)
+            else:
+                results = (
+                    (entry, renderer.renderPage(entry[0])) for entry in needed()
+                )
+
+            for (item, deps), (thisGood, messages, written) in results:
+                for msg in messages:
+                    console(msg, error=True)
+
+                for path, size in written:
+                    log("write", path, size)
 
-                try:
-                    result = template(item, partials=partials)
-                except Exception as e:
-                    console(f"Template = {item.template}")
-                    console(f"Item = {item}")
-                    console(str(e))
+                if not thisGood:
                     failure += 1
                     good = False
                     continue
 
-                for genDir, asYaml in ((dataOutDir, False), (yamlOutDir, True)):
-                    path = f"{genDir}/{item.fileName}"
-                    if asYaml:
-                        path = path.rsplit(".", 1)[0] + ".yaml"
-                    dirPart = dirNm(path)
-                    dirMake(dirPart)
-
-                    if asYaml:
-                        writeYaml(deepdict(item), asFile=path)
-                    else:
-                        with open(path, "w") as fh:
-                            fh.write(result)
+                if graph is not None:
+                    graph.record(target, item.fileName, deps)
 
                 success += 1
 
-            goodStr = f"{success:>3} ok"
+            if debugFh is not None:
+                debugFh.close()
+                log("write", debugPath, getSize(debugPath))
+
+            # pages of earlier builds that are not generated anymore
+            if graph is not None:
+                for fileName in graph.stale(target, produced):
+                    for path in renderer.outPaths(AttrDict(fileName=fileName)):
+                        if fileExists(path):
+                            fileRemove(path)
+                            log("delete", path, 0)
+                            removed += 1
+
+            goodStr = (
+                f"{success:>3} ok"
+                + (f", {kept:>3} kept" if kept else "")
+                + (f", {removed:>3} removed" if removed else "")
+            )
             badStr = f"{failure:>3} XX" if failure else ""
             sep = ";" if failure else " "
             report = f"{goodStr}{sep} {badStr}"
@@ -664,21 +963,49 @@ class Build:
             return good
 
         good = True
+        instrument = self.instrument
+
+        if delta is not None:
+            instrument.listeners.append(delta.log)
 
-        if not copyFromExport():
-            good = False
+        with instrument.phase("copyFromExport") as ph:
+            if not copyFromExport(ph.log):
+                good = False
 
         for kind in ("js", "images", "viewers"):
-            if not copyStaticFolder(kind):
+            with instrument.phase(f"copyStaticFolder:{kind}") as ph:
+                if not copyStaticFolder(kind, ph.log):
+                    good = False
+
+        with instrument.phase("registerPartials"):
+            if not registerPartials():
+                good = False
+
+        with instrument.phase("genCss"):
+            if not genCss():
                 good = False
 
-        if not registerPartials():
-            good = False
+        if assets is not None:
+            with instrument.phase("fingerprintAssets") as ph:
+                fingerprintAssets(ph.log)
+
+        viewersPath = f"{dataOutDir}/{VIEWERS_FILE}"
+
+        if not self.editionVariants:
+            with instrument.phase("viewerManifest"):
+                self.writeViewerManifest(viewersPath)
+                deltaCheck(viewersPath)
+        elif fileExists(viewersPath):
+            # left over from a build without edition variants
+            with instrument.phase("viewerManifest") as ph:
+                fileRemove(viewersPath)
+                ph.log("delete", viewersPath, 0)
 
-        if not genCss():
-            good = False
+        with instrument.phase("getRawData") as ph:
+            self.getRawData(log=ph.log)
 
-        self.getRawData()
+        with instrument.phase("makeIndex"):
+            self.makeIndex()
 
         for target in """
             site
@@ -688,8 +1015,47 @@ class Build:
             projectpages
             editionpages
         """.strip().split():
-            if not genTarget(target):
-                good = False
+            with instrument.phase(f"genTarget:{target}") as ph:
+                if not genTarget(target, ph.log):
+                    good = False
+
+        for executor in pool:
+            executor.shutdown()
+
+        if precompressor is not None:
+            with instrument.phase("precompress") as ph:
+                (n, written) = precompressor.run(
+                    dataOutDir, workers=compressSettings.workers, log=ph.log
+                )
+                precompressor.save()
+                report = f"{n:>3} files, {written:>3} written"
+                console(f"{'compressed':<10} {'':<12} {report:<24} in {dataOutDir}")
+
+        elif fileExists(compressPath):
+            # compression has been switched off, so the compressed files that we
+            # have written would be served instead of newer originals
+            with instrument.phase("precompress") as ph:
+                removed = Precompressor(compressPath, encodings=()).clear(log=ph.log)
+                report = f"{removed:>3} removed"
+                kind = "compressed"
+                console(f"{'cleared':<10} {kind:<12} {report:<24} in {dataOutDir}")
+
+        if delta is not None:
+            with instrument.phase("delta"):
+                delta.save(f"{locations.buildDir}/{DELTA_FILE}")
+
+        self.markdown.save()
+
+        if manifest is not None:
+            manifest.save()
+
+        if graph is not None:
+            graph.save()
+
+        instrument.writeReport(f"{locations.buildDir}/{PROFILE_FILE}")
+
+        if self.trace:
+            instrument.writeTrace(self.trace)
 
         if good:
             console("All tasks successful")
@@ -702,7 +1068,39 @@ class Build:
 
 
 def main():
-    B = Build()
+    parser = ArgumentParser(description="Build the Pure3D static site")
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="render all pages, also those that have not changed",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        metavar="N",
+        help="render pages in N parallel worker processes",
+    )
+    parser.add_argument(
+        "--trace",
+        default=None,
+        metavar="FILE",
+        help="write a Chrome trace of the build phases to FILE",
+    )
+    parser.add_argument(
+        "--debug-data",
+        default=None,
+        choices=("off", "yaml", "jsonl"),
+        help=(
+            "write the data of every page: as a YAML file next to it, or as JSON "
+            "lines in one file per target; overrides build.debugData in the config"
+        ),
+    )
+    args = parser.parse_args()
+
+    B = Build(
+        full=args.full, jobs=args.jobs, trace=args.trace, debugData=args.debug_data
+    )
     result = B.build()
     return 0 if result else 1
 
@@ -0,0 +1,321 @@
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from files import (
+    AtomicFile,
+    readJson,
+    writeJson,
+    dirMake,
+    dirNm,
+    fileExists,
+    fileRemove,
+)
+from helpers import console
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE = {
+    ".html",
+    ".css",
+    ".js",
+    ".mjs",
+    ".json",
+    ".map",
+    ".svg",
+    ".txt",
+    ".xml",
+    ".gltf",
+    ".obj",
+    ".ply",
+    ".stl",
+}
+"""Extensions of files that are worth compressing.
+
+Images, fonts and binary glTF files are already compressed.
+"""
+
+
+CHUNK_SIZE = 1 << 20
+"""Files are compressed in chunks of this many bytes."""
+
+
+def _gzip(large):
+    # wbits=31 gives the gzip format; zlib writes mtime 0 and no file name,
+    # so the result depends on the content only
+    comp = zlib.compressobj(6 if large else 9, zlib.DEFLATED, 31)
+    return (comp.compress, comp.flush)
+
+
+def _brotli(large):
+    comp = brotli.Compressor(quality=5 if large else 11)
+    return (comp.process, comp.finish)
+
+
+ENCODERS = dict(gz=_gzip, br=_brotli)
+"""Compressors by the extension of the compressed file.
+
+A compressor is made for a single file. It is a function that compresses a chunk
+and a function that finishes the compression.
+Large files get a faster compression, at the cost of a slightly larger result.
+"""
+
+
+class Precompressor:
+    """Writes compressed siblings of the files in the dist tree.
+
+    Next to a file `name.html` we write `name.html.gz` and `name.html.br`,
+    so that the web server can send them as they are to clients that accept them,
+    without compressing them on every request.
+
+    We only compress files that have changed since the previous time:
+    we remember the size and modification time of the files we have seen,
+    and which compressed versions we have written for them.
+    If a compressed version is not sufficiently smaller than the original,
+    we do not write it.
+
+    Compressed files whose original has disappeared are removed, but only if we
+    have written them ourselves: compressed files may also come from the export.
+    For the same reason we never overwrite a compressed file that we have not
+    written.
+    """
+
+    def __init__(
+        self,
+        path,
+        encodings=("gz", "br"),
+        minGain=0.1,
+        minSize=256,
+        largeSize=1 << 24,
+    ):
+        """Set up the compressor.
+
+        Parameters
+        ----------
+        path: string
+            The file where we remember the state of the files between builds.
+        encodings: iterable of string, optional ("gz", "br")
+            The compressions to perform, by the extension of the compressed file.
+            Brotli (`br`) is skipped if the `brotli` module is not installed.
+        minGain: float, optional 0.1
+            The fraction of the size that compression must save at least.
+        minSize: integer, optional 256
+            Smaller files are not compressed.
+        largeSize: integer, optional 16777216
+            Files of this size or larger, such as big 3D models, get a faster
+            compression.
+        """
+        self.path = path
+        self.minGain = minGain
+        self.minSize = minSize
+        self.largeSize = largeSize
+
+        if "br" in encodings and brotli is None:
+            console("WARNING: brotli is not installed, no .br files will be written")
+            encodings = [enc for enc in encodings if enc != "br"]
+
+        self.encodings = tuple(enc for enc in encodings if enc in ENCODERS)
+        self.prev = readJson(asFile=path, plain=True)
+        self.entries = {}
+
+    @property
+    def siblings(self):
+        """The extensions of the compressed files, for `files.dirUpdate()`."""
+        return tuple(f".{enc}" for enc in self.encodings)
+
+    def own(self, path):
+        """The encodings of the compressed files of a file that we have written."""
+        prevEntry = self.prev.get(path, None)
+        return set() if prevEntry is None else set(prevEntry[3])
+
+    def removeOwn(self, path, log, encodings=None):
+        """Removes compressed files of a file, as far as we have written them.
+
+        Parameters
+        ----------
+        path: string
+            The original file.
+        log: function
+            If not None, it is called for every removed file.
+        encodings: iterable of string, optional None
+            The encodings to consider. If None, all encodings that we have written
+            for this file.
+
+        Returns
+        -------
+        integer
+            The number of compressed files that have been removed.
+        """
+        own = self.own(path)
+        removed = 0
+
+        for enc in own if encodings is None else own & set(encodings):
+            compPath = f"{path}.{enc}"
+
+            if fileExists(compPath):
+                fileRemove(compPath)
+                removed += 1
+
+                if log is not None:
+                    log("delete", compPath, 0)
+
+        return removed
+
+    def compressFile(self, path, size, encodings, log):
+        """Writes the compressed versions of a single file, if they pay off.
+
+        The file is read in chunks, so that large files do not have to fit
+        in memory.
+
+        Returns
+        -------
+        list of string
+            The encodings of the compressed files that have been written.
+        """
+        maxSize = size * (1 - self.minGain)
+        large = size >= self.largeSize
+        done = []
+
+        for enc in encodings:
+            compPath = f"{path}.{enc}"
+            (process, finish) = ENCODERS[enc](large)
+            out = AtomicFile(compPath, "wb")
+
+            with open(path, "rb") as fh, out as outFh:
+                while True:
+                    chunk = fh.read(CHUNK_SIZE)
+
+                    if not chunk:
+                        break
+
+                    outFh.write(process(chunk))
+
+                outFh.write(finish())
+                compSize = outFh.tell()
+                paysOff = compSize <= maxSize
+
+                if not paysOff:
+                    out.discard()
+
+            if not paysOff:
+                continue
+
+            done.append(enc)
+
+            if log is not None:
+                log("write", compPath, compSize)
+
+        return done
+
+    def run(self, rootDir, workers=8, log=None):
+        """Compresses the changed files under a directory, in parallel.
+
+        Parameters
+        ----------
+        rootDir: string
+            The dist tree.
+        workers: integer, optional 8
+            The number of threads that compress files.
+        log: function, optional None
+            If given, it is called for every compressed file that is written
+            or removed, see `instrument.Phase.log()`.
+
+        Returns
+        -------
+        tuple
+            The number of files that have been compressed again, and the number of
+            compressed files that have been written.
+        """
+        encodings = self.encodings
+        siblings = self.siblings
+        minSize = self.minSize
+        prev = self.prev
+        entries = self.entries
+        todo = []
+
+        for dirPath, dirNames, fileNames in os.walk(rootDir):
+            names = set(fileNames)
+
+            for name in fileNames:
+                path = f"{dirPath}/{name}"
+
+                if name.endswith(siblings):
+                    (stem, enc) = name.rsplit(".", 1)
+
+                    if stem not in names:
+                        self.removeOwn(f"{dirPath}/{stem}", log, encodings=[enc])
+                    continue
+
+                if os.path.splitext(name)[1] not in COMPRESSIBLE:
+                    continue
+
+                st = os.stat(path)
+
+                if st.st_size < minSize:
+                    self.removeOwn(path, log)
+                    continue
+
+                stat = [st.st_size, st.st_mtime_ns]
+                prevEntry = prev.get(path, None)
+
+                if (
+                    prevEntry is not None
+                    and prevEntry[0:3] == stat + [list(encodings)]
+                    and all(f"{name}.{enc}" in names for enc in prevEntry[3])
+                ):
+                    entries[path] = prevEntry
+                    continue
+
+                # our compressed files are outdated now, also if they will not be
+                # written again
+                own = self.own(path)
+                self.removeOwn(path, log)
+                theseEncodings = [
+                    enc
+                    for enc in encodings
+                    if enc in own or f"{name}.{enc}" not in names
+                ]
+
+                if theseEncodings:
+                    todo.append((path, stat, theseEncodings))
+                else:
+                    entries[path] = stat + [list(encodings), []]
+
+        with ThreadPoolExecutor(max_workers=max(workers or 1, 1)) as pool:
+            results = pool.map(
+                lambda item: self.compressFile(item[0], item[1][0], item[2], log), todo
+            )
+            written = 0
+
+            for (path, stat, theseEncodings), done in zip(todo, results):
+                entries[path] = stat + [list(encodings), done]
+                written += len(done)
+
+        return (len(todo), written)
+
+    def clear(self, log=None):
+        """Removes all compressed files that we have written, and forgets them.
+
+        Use this when compression has been switched off, otherwise the compressed
+        files would be served instead of newer versions of their originals.
+
+        Returns
+        -------
+        integer
+            The number of compressed files that have been removed.
+        """
+        removed = sum(self.removeOwn(path, log) for path in self.prev)
+        self.prev = {}
+        self.entries = {}
+        fileRemove(self.path)
+        return removed
+
+    def save(self):
+        """Remembers the state of the files that we have seen in this run."""
+        path = self.path
+        dirMake(dirNm(path))
+        writeJson(self.entries, asFile=path, atomic=True)
@@ -0,0 +1,183 @@
+import os
+from threading import Lock
+
+from files import (
+    fileExists,
+    fileHash,
+    fileRemove,
+    readJson,
+    writeJson,
+    dirMake,
+    dirNm,
+)
+from helpers import console
+
+
+DELTA_VERSION = 1
+
+
+class Delta:
+    """Collects the changes that a build makes to the dist tree.
+
+    During the build, every file that is copied, written or deleted is reported
+    to `log()`, just like it is reported to the instrumentation of the build.
+    Files that the build may have written outside those channels are reported
+    to `check()`.
+
+    At the end, `save()` compares the reported files with an index of the dist
+    tree as it was after the previous build, which holds the size and hash of
+    every file. Files that turn out to be unchanged are left out.
+    The result is a list of added, modified and deleted files, which a deploy step
+    can use to push exactly those files and to purge exactly those URLs from
+    a CDN.
+
+    If there is no index of the previous build, all reported files count as
+    added, and the index is made from scratch by hashing the whole dist tree.
+
+    Reported files are also written to a journal as soon as they are reported.
+    If a build stops before `save()`, the next build picks up the files in the
+    journal, so that they are not missed in its list of changes.
+    """
+
+    def __init__(self, dataOutDir, indexPath):
+        """Set up the collection of changes.
+
+        Parameters
+        ----------
+        dataOutDir: string
+            The dist tree.
+        indexPath: string
+            The file where we keep the index of the dist tree between builds.
+            The journal is kept next to it.
+        """
+        self.dataOutDir = dataOutDir
+        self.indexPath = indexPath
+        self.journalPath = f"{indexPath}.pending"
+        self.lock = Lock()
+        self.changed = set()
+        self.deleted = set()
+
+        prev = readJson(asFile=indexPath, plain=True)
+
+        if prev.get("version") != DELTA_VERSION or prev.get("dataOut") != dataOutDir:
+            prev = {}
+
+        self.fresh = not prev
+        self.index = prev.get("files", {})
+
+        # files reported by a build that did not finish; whether they have been
+        # written or deleted, is found out in save()
+        journalPath = self.journalPath
+
+        if fileExists(journalPath):
+            with open(journalPath, encoding="utf8") as fh:
+                self.changed |= {line.rstrip("\n") for line in fh if line.strip()}
+
+        self.journaled = set(self.changed)
+        dirMake(dirNm(journalPath))
+        self.journal = open(journalPath, "a", encoding="utf8")
+
+    def relPath(self, path):
+        """The path relative to the dist tree, or None if it is outside it."""
+        rel = os.path.relpath(path, self.dataOutDir)
+        return None if rel == ".." or rel.startswith("../") else rel
+
+    def log(self, action, path, size=0):
+        """Registers a file action.
+
+        It has the same signature as `instrument.Phase.log()`.
+        Actions other than `copy`, `write` and `delete` are ignored.
+        It can be called from several threads at the same time.
+        """
+        if action not in {"copy", "write", "delete"}:
+            return
+
+        rel = self.relPath(path)
+
+        if rel is None:
+            return
+
+        with self.lock:
+            if action == "delete":
+                self.changed.discard(rel)
+                self.deleted.add(rel)
+            else:
+                self.deleted.discard(rel)
+                self.changed.add(rel)
+
+            if rel not in self.journaled:
+                self.journaled.add(rel)
+                self.journal.write(f"{rel}\n")
+                self.journal.flush()
+
+    def check(self, path):
+        """Registers a file that may or may not have been changed by the build."""
+        self.log("write", path)
+
+    def save(self, path):
+        """Determines the changes, writes them to a file, and updates the index.
+
+        Parameters
+        ----------
+        path: string
+            The file that receives the changes, as JSON with keys `added`,
+            `modified` and `deleted`. Each of them holds a list of files, with
+            their path relative to the dist tree, their URL, and, except for
+            deleted files, their size and hash.
+
+        Returns
+        -------
+        dict
+            The changes.
+        """
+        dataOutDir = self.dataOutDir
+        index = self.index
+        added = []
+        modified = []
+        deleted = []
+
+        for rel in sorted(self.changed | self.deleted):
+            fullPath = f"{dataOutDir}/{rel}"
+
+            if not fileExists(fullPath):
+                if rel in index:
+                    del index[rel]
+                    deleted.append(dict(path=rel, url=f"/{rel}"))
+                continue
+
+            entry = [os.path.getsize(fullPath), fileHash(fullPath)]
+            prevEntry = index.get(rel, None)
+
+            if prevEntry == entry:
+                continue
+
+            index[rel] = entry
+            info = dict(path=rel, url=f"/{rel}", size=entry[0], hash=entry[1])
+            (added if prevEntry is None else modified).append(info)
+
+        if self.fresh:
+            for dirPath, dirNames, fileNames in os.walk(dataOutDir):
+                for name in fileNames:
+                    fullPath = f"{dirPath}/{name}"
+                    rel = os.path.relpath(fullPath, dataOutDir)
+
+                    if rel not in index:
+                        index[rel] = [os.path.getsize(fullPath), fileHash(fullPath)]
+
+        changes = dict(added=added, modified=modified, deleted=deleted)
+
+        dirMake(dirNm(path))
+        writeJson(dict(dataOut=dataOutDir, **changes), asFile=path)
+        writeJson(
+            dict(version=DELTA_VERSION, dataOut=dataOutDir, files=index),
+            asFile=self.indexPath,
+            atomic=True,
+        )
+
+        # the changes are in the index now
+        self.journal.close()
+        fileRemove(self.journalPath)
+
+        report = f"{len(added)} added, {len(modified)} modified, {len(deleted)} deleted"
+        console(f"{'written':<10} {'delta':<12} {report:<24} to {path}")
+        return changes
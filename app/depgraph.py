@@ -0,0 +1,256 @@
+import re
+import json
+
+from files import fileExists, dirMake, dirNm, writeJson, readJson, textHash
+from generic import deepdict
+
+
+PARTIAL_RE = re.compile(r"""\{\{~?#?>\s*([^\s}]+)""")
+
+GRAPH_VERSION = 1
+
+
+class DepGraph:
+    """A persistent dependency graph of the generated pages.
+
+    For every output file we record from which inputs it has been rendered:
+
+    *   the template;
+    *   the partials that the template uses, directly or indirectly;
+    *   the configuration;
+    *   the page data, which is distilled from the raw records of the Mongo export.
+
+    Of each of these inputs we store a hash, and the combination of these hashes
+    is the key of the output file.
+
+    When we rebuild, we compute the key of each page again. If it is equal to the
+    key of the previous build, and the output file is still there, we do not
+    have to render the page again.
+
+    The graph is stored as a JSON file between builds.
+    It also tells which pages of the previous build are not generated anymore,
+    see `stale()`.
+    """
+
+    def __init__(self, path, dataOutDir, templateDir, partialsIn, cfgKey, full=False):
+        """Load the graph of the previous build.
+
+        Parameters
+        ----------
+        path: string
+            The file where the graph is persisted.
+        dataOutDir: string
+            The directory that holds the generated pages.
+            If the previous build went to another directory, the previous graph is
+            not valid for this build.
+        templateDir: string
+            The directory of the templates.
+        partialsIn: string
+            The directory of the partials.
+        cfgKey: string
+            A hash of the configuration of this build.
+        full: boolean, optional False
+            If True, we discard the keys of the previous graph, so that all pages
+            will be rendered.
+        """
+        self.path = path
+        self.dataOutDir = dataOutDir
+        self.templateDir = templateDir
+        self.partialsIn = partialsIn
+        self.cfgKey = cfgKey
+
+        prev = readJson(asFile=path, plain=True)
+
+        if (
+            prev.get("version") != GRAPH_VERSION
+            or prev.get("dataOut") != dataOutDir
+        ):
+            prev = {}
+
+        prevPages = prev.get("pages", {})
+        self.prevPages = {} if full else prevPages
+        self.prevTargets = {
+            fileName: info["target"] for (fileName, info) in prevPages.items()
+        }
+
+        self.templates = {}
+        self.partials = {}
+        self.pages = {}
+        self.templateInfo = {}
+
+    def addInput(self, key):
+        """Adds an input on which all pages depend, such as the asset manifest.
+
+        Parameters
+        ----------
+        key: string
+            A hash of the input.
+        """
+        self.cfgKey = textHash(f"{self.cfgKey}\n{key}")
+
+    def partialHash(self, partial):
+        """Compute the hash of a partial and collect the partials it refers to."""
+        partials = self.partials
+
+        if partial not in partials:
+            path = f"{self.partialsIn}/{partial}.html"
+
+            if fileExists(path):
+                with open(path) as fh:
+                    text = fh.read()
+            else:
+                text = ""
+
+            partials[partial] = (textHash(text), sorted(set(PARTIAL_RE.findall(text))))
+
+        return partials[partial]
+
+    def templateDeps(self, template):
+        """Compute the key of a template, including the partials it uses.
+
+        Parameters
+        ----------
+        template: string
+            The file name of the template, relative to the template directory.
+
+        Returns
+        -------
+        tuple
+            The key of the template and the sorted list of partials that it uses,
+            directly or indirectly.
+        """
+        templateInfo = self.templateInfo
+
+        if template not in templateInfo:
+            path = f"{self.templateDir}/{template}"
+
+            if fileExists(path):
+                with open(path) as fh:
+                    text = fh.read()
+            else:
+                text = ""
+
+            tHash = textHash(text)
+            self.templates[template] = tHash
+
+            used = set()
+            todo = set(PARTIAL_RE.findall(text))
+
+            while todo:
+                partial = todo.pop()
+
+                if partial in used:
+                    continue
+
+                used.add(partial)
+                todo |= set(self.partialHash(partial)[1]) - used
+
+            used = sorted(used)
+            pKey = textHash(
+                "\n".join(f"{p}={self.partialHash(p)[0]}" for p in used)
+            )
+            templateInfo[template] = (textHash(f"{tHash}\n{pKey}"), used)
+
+        return templateInfo[template]
+
+    def key(self, item):
+        """Compute the key of a page from all of its inputs.
+
+        Parameters
+        ----------
+        item: dict
+            The page data. It must have the members `template` and `fileName`.
+
+        Returns
+        -------
+        dict
+            The hashes of the inputs of the page, and their combination under
+            key `key`.
+        """
+        (tKey, used) = self.templateDeps(item.template)
+        dataKey = textHash(
+            json.dumps(deepdict(item), sort_keys=True, ensure_ascii=False, default=str)
+        )
+        return dict(
+            template=item.template,
+            partials=used,
+            config=self.cfgKey,
+            data=dataKey,
+            key=textHash(f"{tKey}\n{self.cfgKey}\n{dataKey}"),
+        )
+
+    def isFresh(self, fileName, deps, paths):
+        """Whether a page is unchanged since the previous build.
+
+        Parameters
+        ----------
+        fileName: string
+            The name of the page, relative to the output directory.
+        deps: dict
+            The result of `key()` for this page.
+        paths: iterable of string
+            The files that have been generated for this page in the previous build.
+            If one of them is missing, the page is not fresh.
+        """
+        prev = self.prevPages.get(fileName, None)
+
+        return (
+            prev is not None
+            and prev["key"] == deps["key"]
+            and all(fileExists(path) for path in paths)
+        )
+
+    def record(self, target, fileName, deps):
+        """Record the inputs of a page that is part of this build."""
+        self.pages[fileName] = dict(target=target, **deps)
+
+    def stale(self, target, produced):
+        """The pages of a target in the previous build that are not produced now.
+
+        Only pages in a directory where this build produces a page of the same
+        target are considered, such as the viewer specific pages of an edition that
+        now has a single page. Pages of projects and editions that are not in the
+        export are left alone.
+
+        Parameters
+        ----------
+        target: string
+            The target, such as `editionpages`.
+        produced: set of string
+            The names of the pages of the target in this build, relative to the
+            output directory.
+
+        Returns
+        -------
+        list of string
+            The names of the stale pages.
+        """
+        dirs = {dirNm(fileName) for fileName in produced}
+
+        return sorted(
+            fileName
+            for (fileName, prevTarget) in self.prevTargets.items()
+            if prevTarget == target
+            and fileName not in produced
+            and dirNm(fileName) in dirs
+        )
+
+    def save(self):
+        """Persist the graph of this build.
+
+        Pages that have not been part of this build are dropped from the graph.
+        """
+        path = self.path
+        dirMake(dirNm(path))
+
+        writeJson(
+            dict(
+                version=GRAPH_VERSION,
+                dataOut=self.dataOutDir,
+                templates=self.templates,
+                partials={k: v[0] for (k, v) in self.partials.items()},
+                pages=self.pages,
+            ),
+            asFile=path,
+            atomic=True,
+        )
@@ -1,10 +1,20 @@
 import os
 import json
+import codecs
+import fcntl
 import yaml
 
-from shutil import rmtree, copytree, copy
+from hashlib import blake2b
+from concurrent.futures import ThreadPoolExecutor
 
-from generic import deepAttrDict
+from shutil import rmtree, copytree, copy, copy2, copyfileobj, copymode
+
+from generic import AttrDict, deepAttrDict
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 def str_presenter(dumper, data):
@@ -18,6 +28,13 @@ def str_presenter(dumper, data):
 
 
 yaml.add_representer(str, str_presenter)
+
+YAML_DUMPER = getattr(yaml, "CDumper", yaml.Dumper)
+"""The dumper of `writeYaml()`: the fast libyaml one, if PyYAML has been built with it.
+"""
+
+if YAML_DUMPER is not yaml.Dumper:
+    yaml.add_representer(str, str_presenter, Dumper=YAML_DUMPER)
 yaml.representer.SafeRepresenter.add_representer(str, str_presenter)
 
 
@@ -36,6 +53,28 @@ scanDir = os.scandir
 walkDir = os.walk
 splitExt = os.path.splitext
 mTime = os.path.getmtime
+getSize = os.path.getsize
+
+HASH_CHUNK = 1 << 20
+
+COPY_STRATEGIES = ("copy", "hardlink", "reflink", "range")
+"""Ways to copy a file to the static file area.
+
+*   `copy`: a plain copy;
+*   `hardlink`: the destination becomes a hard link to the source;
+*   `reflink`: the destination shares its data blocks with the source until
+    either of them is modified (copy-on-write);
+    only possible on file systems that support it, such as btrfs and xfs;
+*   `range`: the data is copied within the kernel by `copy_file_range`, or,
+    if that is not possible, by `sendfile`; some file systems turn this into
+    a reflink or a server-side copy.
+
+If a strategy is not possible for a file, we fall back to the next less
+efficient strategy, and ultimately to a plain copy.
+"""
+
+FICLONE = 0x40049409
+"""The Linux ioctl request code to make a reflink of a file."""
 
 
 def abspath(path):
@@ -172,13 +211,81 @@ def fileRemove(path):
         os.remove(path)
 
 
-def fileCopy(pathSrc, pathDst):
+def _fileReflink(pathSrc, pathDst):
+    with open(pathSrc, "rb") as inFh, open(pathDst, "wb") as outFh:
+        fcntl.ioctl(outFh.fileno(), FICLONE, inFh.fileno())
+
+    copymode(pathSrc, pathDst)
+
+
+def _fileCopyRange(pathSrc, pathDst):
+    with open(pathSrc, "rb") as inFh, open(pathDst, "wb") as outFh:
+        inFd = inFh.fileno()
+        outFd = outFh.fileno()
+        size = os.fstat(inFd).st_size
+        offset = 0
+
+        try:
+            while offset < size:
+                n = os.copy_file_range(inFd, outFd, size - offset)
+                if n == 0:
+                    break
+                offset += n
+        except (AttributeError, OSError):
+            pass
+
+        try:
+            while offset < size:
+                n = os.sendfile(outFd, inFd, offset, size - offset)
+                if n == 0:
+                    break
+                offset += n
+        except (AttributeError, OSError):
+            pass
+
+        if offset < size:
+            inFh.seek(offset)
+            outFh.seek(offset)
+            copyfileobj(inFh, outFh)
+
+    copymode(pathSrc, pathDst)
+
+
+def fileCopy(pathSrc, pathDst, strategy="copy"):
     """Copies a file if it exists as file.
 
     Wipes the destination file, if it exists.
+
+    Parameters
+    ----------
+    pathSrc: string
+        The source file.
+    pathDst: string
+        The destination file.
+    strategy: string, optional "copy"
+        How the file is copied, see `COPY_STRATEGIES`.
     """
     if fileExists(pathSrc):
         fileRemove(pathDst)
+
+        if strategy == "hardlink":
+            try:
+                os.link(pathSrc, pathDst)
+                return
+            except OSError:
+                strategy = "range"
+
+        if strategy == "reflink":
+            try:
+                _fileReflink(pathSrc, pathDst)
+                return
+            except OSError:
+                strategy = "range"
+
+        if strategy == "range":
+            _fileCopyRange(pathSrc, pathDst)
+            return
+
         copy(pathSrc, pathDst)
 
 
@@ -222,27 +329,235 @@ def dirMove(pathSrc, pathDst):
     return True
 
 
-def dirCopy(pathSrc, pathDst, noclobber=False):
+def dirCopy(pathSrc, pathDst, noclobber=False, strategy="copy", log=None):
     """Copies a directory if it exists as directory.
 
     Wipes the destination directory, if it exists.
+
+    The files are copied according to `strategy`, see `fileCopy()`.
+    If `log` is given, it is called for every copied file, see `dirUpdate()`.
     """
     if dirExists(pathSrc):
         if dirExists(pathDst):
             if noclobber:
                 return False
         dirRemove(pathDst)
-        copytree(pathSrc, pathDst)
+
+        copyFunc = (
+            copy2
+            if strategy == "copy"
+            else lambda src, dst: fileCopy(src, dst, strategy=strategy)
+        )
+
+        if log is None:
+            copyFunction = copyFunc
+        else:
+
+            def copyFunction(src, dst):
+                copyFunc(src, dst)
+                log("copy", dst, os.path.getsize(dst))
+
+        copytree(pathSrc, pathDst, copy_function=copyFunction)
         return True
     else:
         return False
 
 
-def dirUpdate(pathSrc, pathDst, force=False, delete=True, recursive=True):
+def fileHash(path):
+    """Compute a hash of the contents of a file.
+
+    The file is read in chunks, so that large files do not have to fit in memory.
+    """
+    h = blake2b(digest_size=16)
+
+    with open(path, "rb") as fh:
+        while True:
+            chunk = fh.read(HASH_CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+
+    return h.hexdigest()
+
+
+class AtomicFile:
+    """A file that is written under a temporary name, and renamed when complete.
+
+    Readers never see a half written file: they see the previous version until
+    the new version is complete. If writing fails, the previous version stays.
+
+    Use it as a context manager, which gives the handle to write to:
+
+        with AtomicFile(path) as fh:
+            fh.write(text)
+
+    If it turns out that the file should not be written after all, call
+    `discard()` within the block; the previous version then stays.
+    """
+
+    def __init__(self, path, mode="w"):
+        """Set up the file.
+
+        Parameters
+        ----------
+        path: string
+            The file to write. Its directory must exist.
+        mode: string, optional "w"
+            The mode to open the file with: `w` for text, which is encoded as UTF-8,
+            or `wb` for bytes.
+        """
+        self.path = path
+        self.tmpPath = f"{path}.{os.getpid()}"
+        self.mode = mode
+        self.keep = True
+
+    def __enter__(self):
+        mode = self.mode
+        encoding = None if "b" in mode else "utf8"
+        self.fh = open(self.tmpPath, mode, encoding=encoding)
+        return self.fh
+
+    def __exit__(self, excType, excValue, traceback):
+        self.fh.close()
+
+        if excType is None and self.keep:
+            os.replace(self.tmpPath, self.path)
+        else:
+            os.remove(self.tmpPath)
+
+        return False
+
+    def discard(self):
+        """Throws away what has been written, leaving the file as it was."""
+        self.keep = False
+
+
+def writeIfChanged(path, data):
+    """Writes a file, but only if its content changes.
+
+    The existing file is compared by size first, and only if the size is equal,
+    by hash. An unchanged file is not touched, so it keeps its modification time.
+
+    A changed file is written to a temporary file first, which then replaces the
+    file, so that readers never see a half written file.
+
+    Parameters
+    ----------
+    path: string
+        The file to write. Its directory must exist.
+    data: string or bytes
+        The new content. Strings are encoded as UTF-8.
+
+    Returns
+    -------
+    boolean
+        Whether the file has been written.
+    """
+    if type(data) is str:
+        data = data.encode("utf8")
+
+    if fileExists(path) and os.path.getsize(path) == len(data):
+        h = blake2b(data, digest_size=16)
+
+        if h.hexdigest() == fileHash(path):
+            return False
+
+    with AtomicFile(path, "wb") as fh:
+        fh.write(data)
+
+    return True
+
+
+class Manifest:
+    """A persistent record of the size, modification time and hash of files.
+
+    We use it to find out whether files have the same content, without
+    reading them over and over again.
+    A file is only hashed again when its size or modification time differs from
+    what is in the manifest.
+    """
+
+    def __init__(self, path):
+        """Load the manifest from disk.
+
+        Parameters
+        ----------
+        path: string
+            The file in which the manifest is persisted.
+            If it does not exist, we start with an empty manifest.
+        """
+        self.path = path
+        self.entries = readJson(asFile=path, plain=True)
+        self.seen = set()
+
+    def hash(self, path):
+        """Get the hash of a file, compute it only if needed."""
+        entries = self.entries
+        st = os.stat(path)
+        entry = entries.get(path, None)
+        self.seen.add(path)
+
+        if entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+
+        result = fileHash(path)
+        entries[path] = [st.st_size, st.st_mtime_ns, result]
+        return result
+
+    def same(self, pathSrc, pathDst):
+        """Whether two existing files have the same content."""
+        if os.path.getsize(pathSrc) != os.path.getsize(pathDst):
+            return False
+
+        return self.hash(pathSrc) == self.hash(pathDst)
+
+    def copied(self, pathSrc, pathDst):
+        """Record that a file has just been copied.
+
+        The destination has the same hash as the source, so we do not have to
+        compute it when we encounter the destination again.
+        """
+        entries = self.entries
+        srcEntry = entries.get(pathSrc, None)
+
+        if srcEntry is not None and fileExists(pathDst):
+            st = os.stat(pathDst)
+            entries[pathDst] = [st.st_size, st.st_mtime_ns, srcEntry[2]]
+            self.seen.add(pathDst)
+
+    def save(self):
+        """Persist the manifest.
+
+        Only entries for files that we have encountered in this run are kept.
+        """
+        path = self.path
+        entries = self.entries
+        dirMake(dirNm(path))
+        writeJson(
+            {k: entries[k] for k in sorted(self.seen) if k in entries}, asFile=path
+        )
+
+
+def dirUpdate(
+    pathSrc,
+    pathDst,
+    force=False,
+    delete=True,
+    recursive=True,
+    manifest=None,
+    strategy="copy",
+    workers=None,
+    progress=None,
+    siblings=(),
+    keep=None,
+    log=None,
+):
     """Makes a destination dir equal to a source dir by copying newer files only.
 
     Files of the source dir that are missing or older in the destination dir are
     copied from the source to the destination.
+    If a manifest is passed, files are compared by content instead of by
+    modification time.
     Files and directories in the destination dir that do not exist in the source
     dir are deleted.
 
@@ -263,78 +578,245 @@ def dirUpdate(pathSrc, pathDst, force=False, delete=True, recursive=True):
         Whether to perform the action recursively.
         If it is False, only the files in the source and destination are compared
         and, if needed, copied or deleted.
+    manifest: Manifest, optional None
+        If given, a file is copied only if its content differs from the content of
+        the destination file. The manifest holds the hashes of the files, so that
+        files need not be read if they have not been touched since the previous
+        time.
+        If None, a file is copied if it is newer than the destination file.
+    strategy: string, optional "copy"
+        How files are copied, see `COPY_STRATEGIES`.
+    workers: integer, optional None
+        If more than 1, the files are compared, copied and deleted by a pool
+        of this many threads, while the directories are being walked.
+        This pays off when most time is spent in waiting for the file system.
+    progress: function, optional None
+        If given, it is called for every directory that has been updated,
+        with the destination directory and the number of copied and deleted items
+        in it, not counting its subdirectories.
+    siblings: iterable of string, optional ()
+        Extensions of files in the destination that belong to a file of the source,
+        such as the precompressed versions `.gz` and `.br`.
+        A file `name.html.gz` is not deleted if `name.html` exists in the source.
+    keep: function, optional None
+        If given, it is called for files in the destination that are not in the
+        source, with the name of the file and the set of names of the files in
+        the source. If it returns True, the file is not deleted.
+    log: function, optional None
+        If given, it is called for every file that is copied or deleted,
+        with the action (`copy` or `delete`), the path of the destination file
+        and its size (0 for deleted files).
+        When a directory is deleted, it is called for every file in it.
+        With `workers`, it is called from several threads.
+
+    Returns
+    -------
+    tuple
+        Whether the update succeeded, the number of copy actions and the number
+        of delete actions.
     """
+    options = dict(
+        force=force,
+        delete=delete,
+        manifest=manifest,
+        strategy=strategy,
+        progress=progress,
+        siblings=tuple(siblings),
+        keep=keep,
+        log=log,
+    )
+
+    if workers is None or workers <= 1:
+        return _dirUpdate(pathSrc, pathDst, None, recursive, **options)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return _dirUpdate(pathSrc, pathDst, pool, recursive, **options)
+
+
+def _dirUpdate(
+    pathSrc,
+    pathDst,
+    pool,
+    recursive,
+    force,
+    delete,
+    manifest,
+    strategy,
+    progress,
+    siblings,
+    keep,
+    log,
+):
+    """Updates a directory, submitting the file work to a pool if there is one.
+
+    See `dirUpdate()`.
+    """
+
+    def logCopy(dst):
+        if log is not None:
+            log("copy", dst, os.path.getsize(dst))
+
+    def removeDir(dst):
+        if log is not None:
+            for path in dirAllFiles(dst):
+                log("delete", path, 0)
+
+        dirRemove(dst)
 
     if not dirExists(pathSrc):
         return (False, 0, 0)
 
     srcPath = pathSrc.rstrip("/")
     dstPath = pathDst.rstrip("/")
+    fresh = False
 
     if not dirExists(pathDst):
         if recursive:
-            return (dirCopy(pathSrc, pathDst), 1, 0)
+            if pool is None:
+                return (dirCopy(pathSrc, pathDst, strategy=strategy, log=log), 1, 0)
+
+            if fileExists(pathDst):
+                return (False, 0, 0)
+
+            dirMake(pathDst)
+            fresh = True
         else:
             if fileExists(pathDst):
                 return (False, 0, 0)
             dirMake(pathDst)
 
             for item in dirContents(pathSrc)[0]:
-                fileCopy(f"{pathSrc}/{item}", f"{pathDst}/{item}")
+                fileCopy(f"{pathSrc}/{item}", f"{pathDst}/{item}", strategy=strategy)
+                logCopy(f"{pathDst}/{item}")
             return (True, 1, 0)
 
     (good, cActions, dActions) = (True, 0, 0)
     (srcFiles, srcDirs) = dirContents(pathSrc, asSet=True)
     (dstFiles, dstDirs) = dirContents(pathDst, asSet=True)
 
-    for item in srcFiles:
+    def updateFile(item):
         src = f"{srcPath}/{item}"
         dst = f"{dstPath}/{item}"
 
         if delete and item in dstDirs:
             if dirExists(dst):
-                dirRemove(dst)
-
-        if item not in dstFiles or force or mTime(src) > mTime(dst):
+                removeDir(dst)
+
+        if (
+            item not in dstFiles
+            or force
+            or (
+                not manifest.same(src, dst)
+                if manifest is not None
+                else mTime(src) > mTime(dst)
+            )
+        ):
             if item in dstDirs:
                 if dirExists(dst):
-                    dirRemove(dst)
-            fileCopy(src, dst)
-            cActions += 1
+                    removeDir(dst)
+            fileCopy(src, dst, strategy=strategy)
+            logCopy(dst)
 
-    for item in dstFiles:
-        src = f"{srcPath}/{item}"
-        dst = f"{dstPath}/{item}"
+            if manifest is not None:
+                manifest.copied(src, dst)
 
-        if delete and item not in srcFiles:
-            if fileExists(dst):
-                fileRemove(dst)
-                dActions += 1
+            return (1, 0)
 
-    if not recursive:
-        return (good, cActions, dActions)
+        return (0, 0)
 
-    for item in srcDirs:
-        src = f"{srcPath}/{item}"
+    def deleteFile(item):
         dst = f"{dstPath}/{item}"
 
-        (thisGood, thisC, thisD) = dirUpdate(src, dst, force=force, delete=delete)
+        if fileExists(dst):
+            fileRemove(dst)
 
-        if not thisGood:
-            good = False
-        cActions += thisC
-        dActions += thisD
+            if log is not None:
+                log("delete", dst, 0)
 
-    for item in dstDirs:
-        src = f"{srcPath}/{item}"
-        dst = f"{dstPath}/{item}"
+            return (0, 1)
 
-        if delete and item not in srcDirs:
-            if dirExists(dst):
-                dirRemove(dst)
-                dActions += 1
+        return (0, 0)
+
+    tasks = [(updateFile, item) for item in srcFiles]
 
-    return (good, cActions, dActions)
+    def isKept(item):
+        if item in srcFiles or (keep is not None and keep(item, srcFiles)):
+            return True
+
+        for ext in siblings:
+            if item.endswith(ext) and isKept(item.removesuffix(ext)):
+                return True
+
+        return False
+
+    if delete:
+        tasks.extend((deleteFile, item) for item in dstFiles if not isKept(item))
+
+    (thisC, thisD) = (0, 0)
+
+    if pool is not None and recursive:
+        # a file that makes way for a directory of the source must be gone
+        # before we descend into that directory, so it is not left to the pool
+        for task, item in tasks:
+            if item in srcDirs:
+                (c, d) = task(item)
+                thisC += c
+                thisD += d
+
+        tasks = [(task, item) for (task, item) in tasks if item not in srcDirs]
+
+    results = (
+        [task(item) for (task, item) in tasks]
+        if pool is None
+        else [pool.submit(task, item) for (task, item) in tasks]
+    )
+
+    if recursive:
+        for item in srcDirs:
+            src = f"{srcPath}/{item}"
+            dst = f"{dstPath}/{item}"
+
+            (subGood, subC, subD) = _dirUpdate(
+                src,
+                dst,
+                pool,
+                True,
+                force=force,
+                delete=delete,
+                manifest=manifest,
+                strategy=strategy,
+                progress=progress,
+                siblings=siblings,
+                keep=keep,
+                log=log,
+            )
+
+            if not subGood:
+                good = False
+            cActions += subC
+            dActions += subD
+
+        for item in dstDirs:
+            src = f"{srcPath}/{item}"
+            dst = f"{dstPath}/{item}"
+
+            if delete and item not in srcDirs and item not in srcFiles:
+                if dirExists(dst):
+                    removeDir(dst)
+                    thisD += 1
+
+    for result in results:
+        (c, d) = result if pool is None else result.result()
+        thisC += c
+        thisD += d
+
+    if progress is not None:
+        progress(dstPath, thisC, thisD)
+
+    if fresh:
+        return (good, 1, 0)
+
+    return (good, cActions + thisC, dActions + thisD)
 
 
 def dirMake(path):
@@ -449,24 +931,199 @@ def chDir(directory):
     return os.chdir(directory)
 
 
+def textHash(text):
+    """Compute a hash of a string.
+
+    The hash is short, but long enough to detect changes in content.
+    """
+    return blake2b(text.encode("utf8"), digest_size=16).hexdigest()
+
+
+def _parseJson(text, plain, preferTuples):
+    """Parses JSON text (string or bytes) into plain data or into `AttrDict`s.
+
+    If we need `AttrDict`s, the parser makes them directly while parsing,
+    instead of making plain dicts that we then have to convert.
+    Only when lists must become tuples we convert afterwards.
+
+    For plain data we use the faster `orjson` parser if it is installed,
+    and fall back to the standard parser for JSON that `orjson` rejects.
+    """
+    if plain or preferTuples:
+        cfg = None
+
+        if orjson is not None:
+            try:
+                cfg = orjson.loads(text)
+            except orjson.JSONDecodeError:
+                pass
+
+        if cfg is None:
+            cfg = json.loads(text)
+
+        return cfg if plain else deepAttrDict(cfg, preferTuples=preferTuples)
+
+    return json.loads(text, object_hook=AttrDict)
+
+
 def readJson(text=None, plain=False, asFile=None, preferTuples=False):
     if asFile is None:
-        cfg = json.loads(text)
-    else:
-        if fileExists(asFile):
-            with open(asFile, encoding="utf8") as fh:
-                cfg = json.load(fh)
-        else:
-            cfg = {}
+        return _parseJson(text, plain, preferTuples)
+
+    if not fileExists(asFile):
+        return {} if plain else AttrDict()
+
+    with open(asFile, "rb") as fh:
+        return _parseJson(fh.read(), plain, preferTuples)
 
-    return cfg if plain else deepAttrDict(cfg, preferTuples=preferTuples)
 
+class JsonRecords:
+    """The records of a JSON file that holds one big array, read one at a time.
 
-def writeJson(data, asFile=None):
+    The file is never loaded into memory as a whole.
+    When we open it, we scan it once, and remember where each record starts and
+    ends in the file, optionally grouped by the value of a key in the records.
+    After that, the records can be iterated in file order, or retrieved
+    group by group.
+
+    Each record is parsed into an `AttrDict`.
+    """
+
+    def __init__(self, path, groupBy=None, chunkSize=1 << 16):
+        """Scan the file.
+
+        Parameters
+        ----------
+        path: string
+            The JSON file. Its top-level value must be an array.
+            If the file does not exist, there are no records.
+        groupBy: tuple of string, optional None
+            A path of keys into the records. If given, the records are indexed
+            by the value found at that path.
+        chunkSize: integer, optional 65536
+            The number of bytes we read at a time while scanning.
+        """
+        self.path = path
+        self.chunkSize = chunkSize
+        self.spans = []
+        self.groups = {}
+
+        spans = self.spans
+        groups = self.groups
+
+        for (start, end, record) in self.scan():
+            spans.append((start, end))
+
+            if groupBy is not None:
+                value = record
+                for k in groupBy:
+                    value = None if value is None else value[k]
+                groups.setdefault(value, []).append((start, end))
+
+    def scan(self):
+        """Reads the records in file order.
+
+        Returns
+        -------
+        iterator
+            For each record a tuple of its start and end byte position in the file,
+            and the record itself.
+        """
+        path = self.path
+
+        if not fileExists(path):
+            return
+
+        decoder = json.JSONDecoder(object_hook=AttrDict)
+        utf8 = codecs.getincrementaldecoder("utf8")()
+        chunkSize = self.chunkSize
+
+        with open(path, "rb") as fh:
+            buf = ""
+            pos = 0
+            bytePos = 0
+            eof = False
+            started = False
+
+            def more(size):
+                nonlocal buf, pos, eof
+                chunk = fh.read(size)
+                if not chunk:
+                    eof = True
+                buf = buf[pos:] + utf8.decode(chunk, final=eof)
+                pos = 0
+
+            more(chunkSize)
+
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n,":
+                    pos += 1
+                    bytePos += 1
+
+                if pos == len(buf):
+                    if eof:
+                        raise ValueError(f"Unexpected end of JSON array in {path}")
+                    more(chunkSize)
+                    continue
+
+                if not started:
+                    if buf[pos] != "[":
+                        raise ValueError(f"No JSON array in {path}")
+                    started = True
+                    pos += 1
+                    bytePos += 1
+                    continue
+
+                if buf[pos] == "]":
+                    return
+
+                size = chunkSize
+
+                while True:
+                    try:
+                        (record, end) = decoder.raw_decode(buf, pos)
+                        if end < len(buf) or eof:
+                            break
+                    except ValueError:
+                        if eof:
+                            raise
+
+                    more(size)
+                    size *= 2
+
+                n = len(buf[pos:end].encode("utf8"))
+                yield (bytePos, bytePos + n, record)
+                bytePos += n
+                pos = end
+
+    def read(self, span):
+        """Reads a single record, given its start and end position in the file."""
+        (start, end) = span
+
+        with open(self.path, "rb") as fh:
+            fh.seek(start)
+            return json.loads(fh.read(end - start), object_hook=AttrDict)
+
+    def __iter__(self):
+        for (start, end, record) in self.scan():
+            yield record
+
+    def __len__(self):
+        return len(self.spans)
+
+    def group(self, value):
+        """The records with a given value for the `groupBy` key, in file order."""
+        for span in self.groups.get(value, []):
+            yield self.read(span)
+
+
+def writeJson(data, asFile=None, atomic=False):
     if asFile is None:
         return json.dumps(data, ensure_ascii=False)
 
-    with open(asFile, "w", encoding="utf8") as fh:
+    with (
+        AtomicFile(asFile) if atomic else open(asFile, "w", encoding="utf8")
+    ) as fh:
         json.dump(data, fh, ensure_ascii=False)
 
 
@@ -485,7 +1142,7 @@ def readYaml(text=None, plain=False, asFile=None, preferTuples=True):
 
 def writeYaml(data, asFile=None):
     if asFile is None:
-        return yaml.dump(data, allow_unicode=True)
+        return yaml.dump(data, allow_unicode=True, Dumper=YAML_DUMPER)
 
     with open(asFile, "w", encoding="utf8") as fh:
-        yaml.dump(data, fh, allow_unicode=True, line_break=None)
+        yaml.dump(data, fh, allow_unicode=True, line_break=None, Dumper=YAML_DUMPER)
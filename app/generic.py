@@ -31,13 +31,96 @@ class AttrDict(dict):
         """Provide a default when retrieving a non-existent member.
 
         This method is used when using the `[key]` notation for accessing members.
+
+        Special names are not provided, otherwise `pickle` would mistake the default
+        for a special method, and we need pickling to send data to worker processes.
         """
+        if key.startswith("__") and key.endswith("__"):
+            raise AttributeError(key)
+
         return None
 
     def deepdict(self):
         return deepdict(self)
 
 
+class Record:
+    """Base class of compact records with a fixed set of members.
+
+    Subclasses declare their members in `__slots__`, so that a record does not
+    carry a dict of its own.
+    Like `AttrDict`, members can be read as attributes and as keys, and members
+    that have not been set give `None`.
+    That is also how the templates see them, and `deepdict()` turns a record into
+    a dict of the members that have been set.
+    A member with value `None` counts as not set.
+
+    Records can be pickled, so they can be sent to worker processes.
+    """
+
+    __slots__ = ()
+    _fields = frozenset()
+    _order = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # the members of the class and its bases, in order and as a set for lookup
+        cls._order = tuple(
+            k for c in reversed(cls.__mro__) for k in c.__dict__.get("__slots__", ())
+        )
+        cls._fields = frozenset(cls._order)
+
+    def __init__(self, **members):
+        # every member gets a value, so that reading a member never fails
+        for k in self._order:
+            setattr(self, k, members.pop(k, None))
+
+        if members:
+            raise AttributeError(f"{type(self).__name__} has no member {min(members)}")
+
+    def __getitem__(self, key):
+        return getattr(self, key) if key in self._fields else None
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def isSet(self, key):
+        """Whether a member has been set."""
+        return self[key] is not None
+
+    __contains__ = isSet
+
+    def __getstate__(self):
+        # only the members that have been set
+        return {k: v for k in self._order if (v := getattr(self, k)) is not None}
+
+    def __setstate__(self, state):
+        for k in self._order:
+            setattr(self, k, state.get(k, None))
+
+    def get(self, key, default=None):
+        value = self[key]
+        return default if value is None else value
+
+    def keys(self):
+        return [k for k in self._order if getattr(self, k) is not None]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self.items())!r})"
+
+    def deepdict(self):
+        return deepdict(self)
+
+
 def deepdict(info):
     """Turns an `AttrDict` into a `dict`, recursively.
 
@@ -46,21 +129,21 @@ def deepdict(info):
     info: any
         The input dictionary. We assume that it is a data structure built by
         `tuple`, `list`, `set`, `frozenset`, `dict` and atomic types such as
-        `int`, `str`, `bool`.
-        We assume there are no user defined objects in it, and no generators
+        `int`, `str`, `bool`, possibly with `AttrDict` and `Record` objects.
+        We assume there are no other user defined objects in it, and no generators
         and functions.
 
     Returns
     -------
     dict
         A dictionary containing the same info as the input dictionary, but where
-        each value of type `AttrDict` is turned into a `dict`.
+        each value of type `AttrDict` or `Record` is turned into a `dict`.
     """
     tp = type(info)
 
     return (
         dict({k: deepdict(v) for (k, v) in info.items()})
-        if tp in {dict, AttrDict}
+        if tp in {dict, AttrDict} or isinstance(info, Record)
         else tuple(deepdict(item) for item in info)
         if tp is tuple
         else frozenset(deepdict(item) for item in info)
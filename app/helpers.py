@@ -65,6 +65,43 @@ def genViewerSelector(
     return "\n".join(html)
 
 
+class ViewerSelector:
+    """The viewer selector of the edition pages, for a given set of viewers.
+
+    The selectors of all pages differ only in the file base of the edition and in
+    the entry of the chosen viewer and version, which is not a link.
+    So for every choice we generate the selector once, by `genViewerSelector()`,
+    with a marker in the place of the file base, and split it on that marker.
+    A page then gets its selector by joining the pieces with its own file base.
+    """
+
+    SLOT = "\x00"
+
+    def __init__(self, allViewers):
+        """Set up the selector.
+
+        Parameters
+        ----------
+        allViewers: tuple
+            The viewers with their versions, as passed to `genViewerSelector()`.
+        """
+        self.allViewers = allViewers
+        self.skeletons = {}
+
+    def __call__(self, chosenViewer, chosenVersion, origViewer, origVersion, fileBase):
+        """Gives the same result as `genViewerSelector()` with the same arguments."""
+        key = (chosenViewer, chosenVersion, origViewer, origVersion)
+        skeleton = self.skeletons.get(key, None)
+
+        if skeleton is None:
+            skeleton = genViewerSelector(
+                self.allViewers, *key, self.SLOT
+            ).split(self.SLOT)
+            self.skeletons[key] = skeleton
+
+        return fileBase.join(skeleton)
+
+
 def console(*msg, error=False, newline=True):
     msg = " ".join(m if type(m) is str else repr(m) for m in msg)
     msg = "" if not msg else ux(msg)
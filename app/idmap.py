@@ -0,0 +1,140 @@
+from files import dirContents, fileExists, readJson, writeJson, dirMake, dirNm
+
+
+IDMAP_VERSION = 1
+
+
+class IdMap:
+    """A persistent mapping of the ids of projects and editions to numbers.
+
+    In the static file area, projects and editions are stored in directories
+    named by number, and those numbers end up in the URLs of the pages.
+    So a project or edition must keep its number from build to build, also when
+    an export contains only a part of the projects and editions.
+
+    The mapping is kept in a single JSON file, which is read once at the start
+    of the build. It is saved as soon as all projects and editions of the export
+    have their numbers, before the static file area is updated, and only if it
+    has changed.
+    The file is replaced atomically, so that an interrupted build does not leave
+    a half written mapping behind.
+
+    Before, the id of a project or edition was stored in a file `id.json` in its
+    directory. If there is no mapping file yet, we build the mapping from these
+    files.
+    """
+
+    def __init__(self, path, projectOutDir):
+        """Load the mapping.
+
+        Parameters
+        ----------
+        path: string
+            The file that holds the mapping.
+        projectOutDir: string
+            The directory with the numbered project directories in the static file
+            area. It is only used when the mapping has to be built from the
+            `id.json` files, and to find the numbers that are in use by
+            directories.
+        """
+        self.path = path
+        self.projectOutDir = projectOutDir
+
+        data = readJson(asFile=path, plain=True)
+
+        if data.get("version") == IDMAP_VERSION:
+            self.projects = {pId: int(pNum) for (pId, pNum) in data["projects"].items()}
+            self.editions = {
+                pId: {eId: int(eNum) for (eId, eNum) in eNums.items()}
+                for (pId, eNums) in data["editions"].items()
+            }
+            self.changed = False
+        else:
+            self.projects = {}
+            self.editions = {}
+            self.migrate(projectOutDir)
+            self.changed = True
+
+    def migrate(self, projectOutDir):
+        """Builds the mapping from the `id.json` files in the static file area."""
+        projects = self.projects
+        editions = self.editions
+
+        for pNum in dirContents(projectOutDir)[1]:
+            pDir = f"{projectOutDir}/{pNum}"
+            pIdFile = f"{pDir}/id.json"
+
+            if not pNum.isdigit() or not fileExists(pIdFile):
+                continue
+
+            pId = readJson(asFile=pIdFile).id
+            projects[pId] = int(pNum)
+            thisEMap = editions.setdefault(pId, {})
+            editionOutDir = f"{pDir}/edition"
+
+            for eNum in dirContents(editionOutDir)[1]:
+                eIdFile = f"{editionOutDir}/{eNum}/id.json"
+
+                if not eNum.isdigit() or not fileExists(eIdFile):
+                    continue
+
+                eId = readJson(asFile=eIdFile).id
+                thisEMap[eId] = int(eNum)
+
+    @staticmethod
+    def maxDir(path):
+        """The highest number of the numbered directories in a directory."""
+        return max(
+            (int(name) for name in dirContents(path)[1] if name.isdigit()), default=0
+        )
+
+    def project(self, pId):
+        """The number of a project, a new one if the project is new.
+
+        New numbers come after the highest number in use, in the mapping and by
+        the directories in the static file area, so that they never collide with
+        numbers of projects that are not in the current export, also not when
+        the mapping file has been lost.
+        """
+        projects = self.projects
+
+        if pId not in projects:
+            projects[pId] = (
+                max(max(projects.values(), default=0), self.maxDir(self.projectOutDir))
+                + 1
+            )
+            self.changed = True
+
+        return projects[pId]
+
+    def edition(self, pId, eId):
+        """The number of an edition within its project, a new one if it is new.
+
+        As for projects, new numbers come after the highest number in use.
+        """
+        thisEMap = self.editions.setdefault(pId, {})
+
+        if eId not in thisEMap:
+            editionOutDir = f"{self.projectOutDir}/{self.project(pId)}/edition"
+            thisEMap[eId] = (
+                max(max(thisEMap.values(), default=0), self.maxDir(editionOutDir)) + 1
+            )
+            self.changed = True
+
+        return thisEMap[eId]
+
+    def save(self):
+        """Writes the mapping to disk, if it has changed."""
+        if not self.changed:
+            return
+
+        path = self.path
+        dirMake(dirNm(path))
+        writeJson(
+            dict(
+                version=IDMAP_VERSION, projects=self.projects, editions=self.editions
+            ),
+            asFile=path,
+            atomic=True,
+        )
+        self.changed = False
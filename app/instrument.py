@@ -0,0 +1,185 @@
+import os
+import resource
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter, process_time
+
+from files import dirMake, dirNm, writeJson
+from helpers import console
+
+
+class Phase:
+    """The measurements of one phase of the build.
+
+    While a phase is running, its `log()` method can be used to count the files that
+    are touched and the bytes that are copied or written.
+    """
+
+    def __init__(self, name, start, listeners=()):
+        self.name = name
+        self.start = start
+        self.listeners = listeners
+        self.wall = 0
+        self.cpu = 0
+        self.cpuChildren = 0
+        self.files = 0
+        self.bytes = 0
+        self.peakRss = 0
+        self.peakRssChildren = 0
+        self.rssGrowth = 0
+        self.rssGrowthChildren = 0
+        self.lock = Lock()
+
+    def log(self, action, path, size=0):
+        """Count a file action.
+
+        This function can be passed as the `log` argument of `dirUpdate()`.
+        It can be called from several threads at the same time.
+        The action is passed on to the listeners of the instrument.
+
+        Parameters
+        ----------
+        action: string
+            What happened to the file, such as `copy`, `write`, or `delete`.
+            Bytes are only counted for copies and writes.
+        path: string
+            The file in question.
+        size: integer, optional 0
+            The size of the file.
+        """
+        with self.lock:
+            self.files += 1
+
+            if action in {"copy", "write"}:
+                self.bytes += size
+
+        for listener in self.listeners:
+            listener(action, path, size)
+
+    def asDict(self):
+        return dict(
+            name=self.name,
+            start=round(self.start, 6),
+            wall=round(self.wall, 6),
+            cpu=round(self.cpu, 6),
+            cpuChildren=round(self.cpuChildren, 6),
+            files=self.files,
+            bytes=self.bytes,
+            peakRss=self.peakRss,
+            peakRssChildren=self.peakRssChildren,
+            rssGrowth=self.rssGrowth,
+            rssGrowthChildren=self.rssGrowthChildren,
+        )
+
+
+def _childCpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _maxRss(who):
+    """The peak resident memory in bytes, of this process or its children."""
+    rss = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macos reports bytes
+    return rss if os.uname().sysname == "Darwin" else rss * 1024
+
+
+class Instrument:
+    """Records timing and resource usage of the phases of a build.
+
+    Per phase we record:
+
+    *   `wall`: elapsed time in seconds;
+    *   `cpu`: cpu time of the build process in seconds;
+    *   `cpuChildren`: cpu time of finished child processes in seconds,
+        such as tailwind and the render workers;
+    *   `files`: the number of files that have been touched;
+    *   `bytes`: the number of bytes that have been copied or written;
+    *   `peakRss`, `peakRssChildren`: the peak memory usage in bytes of the build
+        so far, not of the phase itself, of the build process and of its largest
+        child process;
+    *   `rssGrowth`, `rssGrowthChildren`: how much these peaks have grown during
+        the phase, in bytes; a phase that stays below an earlier peak gets 0.
+
+    Functions in `listeners` receive the file actions of all phases, with the
+    same arguments as `Phase.log()`.
+
+    The results can be written as a JSON report, and as a trace file
+    that can be loaded into the Chrome trace viewer (`chrome://tracing`) or
+    [Perfetto](https://ui.perfetto.dev).
+    """
+
+    def __init__(self):
+        self.origin = perf_counter()
+        self.phases = []
+        self.listeners = []
+
+    @contextmanager
+    def phase(self, name):
+        """Measures a phase of the build.
+
+        Use it as
+
+        ```
+        with instrument.phase("name") as ph:
+            ...
+        ```
+
+        Inside the block, `ph.log` can be used to count file actions.
+        """
+        ph = Phase(name, perf_counter() - self.origin, self.listeners)
+        wallStart = perf_counter()
+        cpuStart = process_time()
+        childStart = _childCpu()
+        rssStart = _maxRss(resource.RUSAGE_SELF)
+        rssChildStart = _maxRss(resource.RUSAGE_CHILDREN)
+
+        try:
+            yield ph
+        finally:
+            ph.wall = perf_counter() - wallStart
+            ph.cpu = process_time() - cpuStart
+            ph.cpuChildren = _childCpu() - childStart
+            ph.peakRss = _maxRss(resource.RUSAGE_SELF)
+            ph.peakRssChildren = _maxRss(resource.RUSAGE_CHILDREN)
+            ph.rssGrowth = ph.peakRss - rssStart
+            ph.rssGrowthChildren = ph.peakRssChildren - rssChildStart
+            self.phases.append(ph)
+
+    def report(self):
+        """The measurements of all phases, as a dict."""
+        phases = [ph.asDict() for ph in self.phases]
+        return dict(
+            wall=round(perf_counter() - self.origin, 6),
+            phases=phases,
+        )
+
+    def writeReport(self, path):
+        """Writes the measurements of all phases as a JSON file."""
+        dirMake(dirNm(path))
+        writeJson(self.report(), asFile=path)
+        console(f"{'written':<10} {'profile':<12} {'':<24} to {path}")
+
+    def writeTrace(self, path):
+        """Writes the phases as a trace file in the Chrome trace event format."""
+        pid = os.getpid()
+        events = [
+            dict(
+                name=ph.name,
+                cat="build",
+                ph="X",
+                ts=round(ph.start * 1e6),
+                dur=round(ph.wall * 1e6),
+                pid=pid,
+                tid=0,
+                args={
+                    k: v
+                    for (k, v) in ph.asDict().items()
+                    if k not in {"name", "start", "wall"}
+                },
+            )
+            for ph in self.phases
+        ]
+        dirMake(dirNm(path))
+        writeJson(dict(traceEvents=events, displayTimeUnit="ms"), asFile=path)
+        console(f"{'written':<10} {'trace':<12} {'':<24} to {path}")
@@ -0,0 +1,137 @@
+import os
+from collections import OrderedDict
+
+import markdown as markdownLib
+
+from files import AtomicFile, dirMake, dirExists, textHash
+
+
+class MarkdownCache:
+    """Converts markdown to HTML, and remembers the results.
+
+    Results are looked up by the hash of the markdown text.
+    In memory we keep a limited number of results, and we evict the least
+    recently used ones first.
+
+    Optionally, the results are also stored on disk, so that unchanged texts
+    need not be converted again in the next build.
+    Every result is a file of its own, in a directory per two leading characters
+    of the hash, and it is only read when it is needed. Besides the results in
+    memory, we only remember the hashes of the texts that are used in this build,
+    so that the others can be removed from disk at the end.
+    The disk store is tied to the version of the markdown library, so that
+    an upgrade of that library invalidates the stored results.
+    """
+
+    def __init__(self, cacheDir=None, size=10000):
+        """Set up the cache.
+
+        Parameters
+        ----------
+        cacheDir: string, optional None
+            The directory where the results are stored on disk.
+            If None, results are only kept in memory.
+        size: integer, optional 10000
+            The maximum number of results kept in memory.
+        """
+        self.size = size
+        self.memory = OrderedDict()
+        self.path = (
+            None
+            if cacheDir is None
+            else f"{cacheDir}/markdown-{markdownLib.__version__}"
+        )
+        self.used = set()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, text):
+        """Convert a markdown text to HTML.
+
+        Parameters
+        ----------
+        text: string
+            The markdown text.
+
+        Returns
+        -------
+        string
+            The HTML.
+        """
+        memory = self.memory
+        key = textHash(text)
+
+        if key in memory:
+            memory.move_to_end(key)
+            self.hits += 1
+            return memory[key]
+
+        html = self.fetch(key)
+
+        if html is None:
+            html = markdownLib.markdown(text)
+            self.misses += 1
+            self.store(key, html)
+        else:
+            self.hits += 1
+
+        memory[key] = html
+
+        if len(memory) > self.size:
+            memory.popitem(last=False)
+
+        if self.path is not None:
+            self.used.add(key)
+
+        return html
+
+    def fetch(self, key):
+        """Reads a result from disk, if it is there."""
+        path = self.path
+
+        if path is None:
+            return None
+
+        try:
+            with open(f"{path}/{key[0:2]}/{key}.html", encoding="utf8") as fh:
+                return fh.read()
+        except FileNotFoundError:
+            return None
+
+    def store(self, key, html):
+        """Writes a result to disk."""
+        path = self.path
+
+        if path is None:
+            return
+
+        shardDir = f"{path}/{key[0:2]}"
+        dirMake(shardDir)
+
+        with AtomicFile(f"{shardDir}/{key}.html") as fh:
+            fh.write(html)
+
+    def save(self):
+        """Removes the results from disk that have not been used in this build.
+
+        The results themselves have already been stored when they were made.
+        """
+        path = self.path
+
+        if path is None:
+            return
+
+        if not dirExists(path):
+            return
+
+        used = self.used
+
+        with os.scandir(path) as shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+
+                with os.scandir(shard.path) as entries:
+                    for entry in entries:
+                        if entry.name.removesuffix(".html") not in used:
+                            os.remove(entry.path)
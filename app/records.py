@@ -0,0 +1,92 @@
+from generic import Record
+
+
+class Project(Record):
+    """The data of a project, for its own page and for lists of projects."""
+
+    __slots__ = (
+        "template",
+        "fileName",
+        "num",
+        "name",
+        "visible",
+        "description",
+        "abstract",
+        "subjects",
+        "contentdata",
+        "editions",
+    )
+
+
+class Edition(Record):
+    """The data of an edition, for its own pages and for lists of editions."""
+
+    __slots__ = (
+        "template",
+        "projectNum",
+        "projectName",
+        "projectFileName",
+        "fileName",
+        "num",
+        "name",
+        "description",
+        "abstract",
+        "subjects",
+        "contentdata",
+        "published",
+        "isPublished",
+        "sceneFile",
+        "singlePage",
+        "origViewer",
+        "origVersion",
+    )
+
+
+class EditionVariant(Record):
+    """The page of an edition in a specific viewer and version.
+
+    The members that are the same for all viewers and versions are in a shared
+    `Edition` record, the base. The members of the variant itself, such as
+    `viewer`, `version` and `fileName`, are in a dict, the overrides.
+    Members that are not in the overrides are read from the base.
+    """
+
+    __slots__ = ("base", "overrides")
+
+    def __init__(self, base, **members):
+        """Put the viewer specific members on top of an edition.
+
+        Parameters
+        ----------
+        base: Edition or EditionVariant
+            The edition. If it is a variant, its overrides are copied, so that
+            variants do not form chains.
+        members: keyword arguments
+            The members that override or extend the base.
+        """
+        if isinstance(base, EditionVariant):
+            members = dict(base.overrides, **members)
+            base = base.base
+
+        self.base = base
+        self.overrides = members
+
+    def __getattr__(self, key):
+        # only called for names that are not slots or methods
+        if key.startswith("__") or key in EditionVariant._fields:
+            raise AttributeError(key)
+
+        return self[key]
+
+    def __getitem__(self, key):
+        overrides = self.overrides
+        return overrides[key] if key in overrides else self.base[key]
+
+    def __setitem__(self, key, value):
+        self.overrides[key] = value
+
+    def keys(self):
+        overrides = self.overrides
+        return [k for k in self.base.keys() if k not in overrides] + [
+            k for (k, v) in overrides.items() if v is not None
+        ]
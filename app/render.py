@@ -0,0 +1,295 @@
+import os
+import re
+from collections import deque
+
+import pybars
+from pybars import Compiler
+
+from files import (
+    AtomicFile,
+    dirNm,
+    dirMake,
+    baseNm,
+    stripExt,
+    dirAllFiles,
+    fileExists,
+    writeYaml,
+    writeIfChanged,
+    textHash,
+)
+from generic import deepdict
+
+
+COMMENT_RE = re.compile(r"""\{\{!--.*?--}}""", re.S)
+
+
+class Renderer:
+    """Renders page data into HTML files by means of Handlebars templates.
+
+    A renderer holds its own compiled partials and templates.
+    When pages are rendered in parallel, each worker process has its own renderer,
+    see `initWorker()` and `renderWorkerBatch()`.
+    """
+
+    def __init__(
+        self,
+        templateDir,
+        partialsIn,
+        dataOutDir,
+        yamlOutDir,
+        cacheDir=None,
+        assets=None,
+    ):
+        """Set up the renderer.
+
+        Parameters
+        ----------
+        templateDir: string
+            The directory of the templates.
+        partialsIn: string
+            The directory of the partials.
+        dataOutDir: string
+            The directory where the HTML files go.
+        yamlOutDir: string
+            The directory where the YAML files with the page data go.
+            If None, no YAML files are written.
+        cacheDir: string, optional None
+            If given, the Python code into which templates and partials are
+            compiled is stored in a subdirectory of this directory, named after
+            the version of pybars. The next time the same source is encountered,
+            it is loaded from there instead of being compiled again.
+        assets: dict, optional None
+            The manifest of fingerprinted assets, see `assets.Assets`.
+            Templates translate asset URLs with it by means of the helper `asset`.
+            URLs that are not in the manifest are left as they are.
+        """
+        self.templateDir = templateDir
+        self.partialsIn = partialsIn
+        self.dataOutDir = dataOutDir
+        self.yamlOutDir = yamlOutDir
+        self.cacheDir = (
+            None if cacheDir is None else f"{cacheDir}/pybars-{pybars.__version__}"
+        )
+
+        self.assets = assets or {}
+
+        self.Handlebars = Compiler()
+        self.partials = {}
+        self.compiledTemplates = {}
+
+        def asset(this, url):
+            return self.assets.get(url, url)
+
+        self.helpers = dict(asset=asset)
+
+    def compile(self, source):
+        """Compiles the source of a template or partial.
+
+        If there is a cache directory, the compiled code is looked up there first,
+        and stored there if it was not yet present.
+        """
+        cacheDir = self.cacheDir
+
+        if cacheDir is None:
+            return self.Handlebars.compile(source)
+
+        path = f"{cacheDir}/{textHash(source)}.py"
+
+        if fileExists(path):
+            with open(path) as fh:
+                code = fh.read()
+        else:
+            code = self.Handlebars.precompile(source)
+            dirMake(cacheDir)
+
+            with AtomicFile(path) as fh:
+                fh.write(code)
+
+        namespace = {}
+        exec(compile(code, path, "exec"), namespace)
+        return namespace["render"]
+
+    def registerPartials(self):
+        """Compiles all partials.
+
+        Returns
+        -------
+        list of string
+            The error messages, one for every partial that could not be compiled.
+        """
+        partialsIn = self.partialsIn
+        partials = self.partials
+        errors = []
+
+        for partialFile in dirAllFiles(partialsIn):
+            pDir = dirNm(partialFile).replace(partialsIn, "").strip("/")
+            pFile = baseNm(partialFile)
+            pName = stripExt(pFile)
+            sep = "" if pDir == "" else "/"
+            partial = f"{pDir}{sep}{pName}"
+
+            with open(partialFile) as fh:
+                pContent = COMMENT_RE.sub("", fh.read())
+
+            try:
+                partials[partial] = self.compile(pContent)
+            except Exception as e:
+                errors.append(f"{partial} : {str(e)}")
+
+        return errors
+
+    def getTemplate(self, template):
+        """Get a compiled template, compile it if needed.
+
+        Returns
+        -------
+        tuple
+            The compiled template, or None if it could not be compiled,
+            and an error message, or None if there is no error.
+        """
+        compiledTemplates = self.compiledTemplates
+        templateFile = f"{self.templateDir}/{template}"
+
+        if templateFile in compiledTemplates:
+            return (compiledTemplates[templateFile], None)
+
+        error = None
+
+        try:
+            with open(templateFile) as fh:
+                tContent = COMMENT_RE.sub("", fh.read())
+
+            compiled = self.compile(tContent)
+        except Exception as e:
+            error = f"{templateFile} : {str(e)}"
+            compiled = None
+
+        compiledTemplates[templateFile] = compiled
+        return (compiled, error)
+
+    def outPaths(self, item):
+        """The paths of the HTML file and, if needed, the YAML file of a page."""
+        fileName = item.fileName
+        path = f"{self.dataOutDir}/{fileName}"
+
+        if self.yamlOutDir is None:
+            return (path,)
+
+        yamlPath = f"{self.yamlOutDir}/{fileName}".rsplit(".", 1)[0] + ".yaml"
+        return (path, yamlPath)
+
+    def renderPage(self, item):
+        """Renders a page and writes it to disk, together with its data as YAML.
+
+        Parameters
+        ----------
+        item: dict
+            The page data, including the members `template` and `fileName`.
+
+        Files whose content does not change are not written again,
+        see `files.writeIfChanged()`.
+
+        Returns
+        -------
+        tuple
+            Whether the rendering succeeded, a list of messages,
+            and a list of the files written, as tuples of path and size.
+            Unchanged files are not in this list.
+        """
+        (template, error) = self.getTemplate(item.template)
+
+        if template is None:
+            return (False, [error] if error else [], [])
+
+        try:
+            result = template(item, helpers=self.helpers, partials=self.partials)
+        except Exception as e:
+            msgs = [f"Template = {item.template}", f"Item = {item}", str(e)]
+            return (False, msgs, [])
+
+        written = []
+
+        for genPath, asYaml in zip(self.outPaths(item), (False, True)):
+            dirPart = dirNm(genPath)
+            dirMake(dirPart)
+
+            text = writeYaml(deepdict(item)) if asYaml else result
+
+            if writeIfChanged(genPath, text):
+                written.append((genPath, os.path.getsize(genPath)))
+
+        return (True, [], written)
+
+
+_renderer = None
+
+
+def initWorker(*args):
+    """Initializes a worker process with its own renderer.
+
+    The arguments are passed to `Renderer`.
+    """
+    global _renderer
+
+    _renderer = Renderer(*args)
+    _renderer.registerPartials()
+
+
+def renderWorkerBatch(items):
+    """Renders a batch of pages in a worker process."""
+    return [_renderer.renderPage(item) for item in items]
+
+
+def renderParallel(pool, entries, jobs, batchSize=8):
+    """Renders pages in worker processes while they are being produced.
+
+    The pages are sent to the workers in batches.
+    We do not send more than a few batches per worker ahead,
+    so that the pages do not pile up in memory when they are produced faster
+    than they can be rendered.
+
+    Parameters
+    ----------
+    pool: ProcessPoolExecutor
+        The worker processes, initialized by `initWorker()`.
+    entries: iterable
+        Tuples of which the first member is the page data.
+    jobs: integer
+        The number of workers.
+    batchSize: integer, optional 8
+        The number of pages in a batch.
+
+    Returns
+    -------
+    iterator
+        Tuples of an entry and the result of `Renderer.renderPage()` for it,
+        in the order of the entries.
+    """
+    window = 2 * jobs
+    pending = deque()
+    batch = []
+
+    def submit():
+        pending.append(
+            (batch, pool.submit(renderWorkerBatch, [entry[0] for entry in batch]))
+        )
+
+    def collect():
+        (doneBatch, future) = pending.popleft()
+        return zip(doneBatch, future.result())
+
+    for entry in entries:
+        batch.append(entry)
+
+        if len(batch) == batchSize:
+            submit()
+            batch = []
+
+            while len(pending) >= window:
+                yield from collect()
+
+    if batch:
+        submit()
+
+    while pending:
+        yield from collect()
@@ -0,0 +1,392 @@
+"""A static file server for the dist tree.
+
+Usage:
+
+```
+python serve.py [--host HOST] [--port PORT] [DIR]
+```
+
+By default, it serves the `dataOut` directory of the config file on port 8050.
+
+The server handles many connections at the same time and keeps them alive,
+so it can be used for load testing a build before it is deployed.
+It supports:
+
+*   `Range` requests, for the large 3D files that viewers read in parts;
+*   `ETag` and `If-None-Match`, so that unchanged files are not sent again;
+*   `Cache-Control`: files whose names contain a content hash, such as
+    `style.3f2a9c1d0e.css`, may be cached for a long time, other files must be
+    revalidated;
+*   precompressed files: if the client accepts it, `name.html.br` or
+    `name.html.gz` is sent instead of `name.html`, see `compress.Precompressor`;
+*   `sendfile`: file contents are sent by the operating system without passing
+    through Python, where the platform supports it.
+"""
+
+import os
+import re
+import sys
+import asyncio
+import mimetypes
+from argparse import ArgumentParser
+from email.utils import formatdate
+from urllib.parse import urlsplit, unquote
+
+from files import (
+    readYaml,
+    dirNm,
+    abspath,
+    dirExists,
+    fileExists,
+    expanduser as ex,
+    unexpanduser as ux,
+)
+from generic import AttrDict
+
+
+CONFIG_FILE = "config.yaml"
+
+HASHED_RE = re.compile(r"""\.[0-9a-f]{8,}\.[A-Za-z0-9]+$""")
+"""Names of files with a content hash in them, see `assets.Assets`."""
+
+RANGE_RE = re.compile(r"""^bytes=([0-9]*)-([0-9]*)$""")
+
+ENCODINGS = (("br", "br"), ("gzip", "gz"))
+"""Content encodings that we can serve precompressed, with their file extensions."""
+
+STORED_ENCODINGS = {
+    "gzip": "application/gzip",
+    "br": "application/x-brotli",
+    "bzip2": "application/x-bzip2",
+    "xz": "application/x-xz",
+    "compress": "application/x-compress",
+}
+"""Content types of compressed files that are requested as they are."""
+
+STATUS = {
+    200: "OK",
+    206: "Partial Content",
+    301: "Moved Permanently",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    416: "Range Not Satisfiable",
+}
+
+MAX_HEADERS = 100
+
+mimetypes.add_type("model/gltf-binary", ".glb")
+mimetypes.add_type("model/gltf+json", ".gltf")
+mimetypes.add_type("text/javascript", ".mjs")
+
+
+class StaticServer:
+    """Serves the files in a directory over HTTP/1.1."""
+
+    def __init__(self, root, maxAge=31536000):
+        """Set up the server.
+
+        Parameters
+        ----------
+        root: string
+            The directory to serve.
+        maxAge: integer, optional 31536000
+            The number of seconds that files with a content hash in their names
+            may be cached.
+        """
+        self.root = os.path.realpath(root)
+        self.maxAge = maxAge
+
+    async def handle(self, reader, writer):
+        """Handles the requests on a connection, until it is closed."""
+        try:
+            while True:
+                request = await self.readRequest(reader)
+
+                if request is None:
+                    break
+
+                keepAlive = await self.respond(writer, *request)
+                await writer.drain()
+
+                if not keepAlive:
+                    break
+        except (
+            ConnectionError,
+            asyncio.IncompleteReadError,
+            asyncio.LimitOverrunError,
+        ):
+            pass
+        finally:
+            writer.close()
+
+    async def readRequest(self, reader):
+        """Reads the request line and headers of a request.
+
+        Returns
+        -------
+        tuple
+            The method, the target, the HTTP version and a dict of headers with
+            lowercase names, or None if the connection has been closed.
+        """
+        line = await reader.readline()
+
+        if not line.strip():
+            return None
+
+        parts = line.decode("latin1").split()
+        headers = {}
+
+        while True:
+            headerLine = await reader.readline()
+
+            if headerLine in {b"\r\n", b"\n", b""}:
+                break
+
+            if len(headers) < MAX_HEADERS:
+                (name, sep, value) = headerLine.decode("latin1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+        length = headers.get("content-length", "0")
+
+        if length.isdigit() and int(length):
+            await reader.readexactly(int(length))
+
+        if len(parts) != 3:
+            return ("", "", "HTTP/1.0", headers)
+
+        return (*parts, headers)
+
+    def resolve(self, target):
+        """Finds the file that a request target refers to.
+
+        Returns
+        -------
+        tuple
+            The path of the file, or None if there is no such file,
+            and the location to redirect to if the target is a directory without
+            a trailing slash.
+        """
+        parts = urlsplit(target)
+        urlPath = unquote(parts.path)
+        root = self.root
+        path = os.path.realpath(os.path.join(root, urlPath.lstrip("/")))
+
+        if path != root and not path.startswith(f"{root}/"):
+            return (None, None)
+
+        if dirExists(path):
+            if not urlPath.endswith("/"):
+                query = f"?{parts.query}" if parts.query else ""
+                return (None, f"{parts.path}/{query}")
+
+            path = f"{path}/index.html"
+
+        return (path if fileExists(path) else None, None)
+
+    def writeHead(self, writer, status, headers, keepAlive):
+        lines = [f"HTTP/1.1 {status} {STATUS[status]}"]
+        headers = dict(
+            headers,
+            Date=formatdate(usegmt=True),
+            Connection="keep-alive" if keepAlive else "close",
+        )
+        lines.extend(f"{k}: {v}" for (k, v) in headers.items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin1"))
+
+    def writeError(self, writer, status, keepAlive, headers=None):
+        body = f"{status} {STATUS[status]}\n".encode("latin1")
+        headers = dict(headers or {})
+        headers["Content-Type"] = "text/plain"
+        headers["Content-Length"] = len(body)
+        self.writeHead(writer, status, headers, keepAlive)
+        writer.write(body)
+
+    async def respond(self, writer, method, target, version, headers):
+        """Responds to a single request.
+
+        Returns
+        -------
+        boolean
+            Whether the connection can be kept alive.
+        """
+        connection = headers.get("connection", "").lower()
+        keepAlive = (
+            connection != "close"
+            if version == "HTTP/1.1"
+            else connection == "keep-alive"
+        )
+
+        if not method:
+            self.writeError(writer, 400, False)
+            return False
+
+        if method not in {"GET", "HEAD"}:
+            self.writeError(writer, 405, keepAlive, headers={"Allow": "GET, HEAD"})
+            return keepAlive
+
+        (path, redirect) = self.resolve(target)
+
+        if redirect is not None:
+            self.writeError(writer, 301, keepAlive, headers={"Location": redirect})
+            return keepAlive
+
+        if path is None:
+            self.writeError(writer, 404, keepAlive)
+            return keepAlive
+
+        (contentType, encoding) = mimetypes.guess_type(path)
+        contentType = (
+            STORED_ENCODINGS[encoding]
+            if encoding in STORED_ENCODINGS
+            else contentType or "application/octet-stream"
+        )
+
+        if contentType.startswith("text/") or contentType in {
+            "application/json",
+            "application/javascript",
+        }:
+            contentType = f"{contentType}; charset=utf-8"
+
+        rangeSpec = headers.get("range", None)
+        accepted = {
+            enc.split(";")[0].strip()
+            for enc in headers.get("accept-encoding", "").split(",")
+            if not enc.replace(" ", "").endswith(";q=0")
+        }
+        # a compressed file that is older than its original is stale,
+        # e.g. when the original has been changed after the build
+        mtime = os.stat(path).st_mtime_ns
+        variants = [
+            (enc, ext)
+            for (enc, ext) in ENCODINGS
+            if fileExists(f"{path}.{ext}")
+            and os.stat(f"{path}.{ext}").st_mtime_ns >= mtime
+        ]
+        contentEncoding = None
+        hashed = HASHED_RE.search(path)
+
+        if rangeSpec is None:
+            for enc, ext in variants:
+                if enc in accepted:
+                    contentEncoding = enc
+                    path = f"{path}.{ext}"
+                    break
+
+        st = os.stat(path)
+        size = st.st_size
+        etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}'
+        etag += f'-{contentEncoding}"' if contentEncoding else '"'
+
+        respHeaders = {
+            "Content-Type": contentType,
+            "ETag": etag,
+            "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+            "Cache-Control": (
+                f"public, max-age={self.maxAge}, immutable"
+                if hashed
+                else "no-cache"
+            ),
+            "Accept-Ranges": "bytes",
+        }
+
+        if variants:
+            respHeaders["Vary"] = "Accept-Encoding"
+
+        if contentEncoding:
+            respHeaders["Content-Encoding"] = contentEncoding
+
+        ifNoneMatch = headers.get("if-none-match", None)
+
+        if ifNoneMatch is not None and (
+            ifNoneMatch.strip() == "*"
+            or etag in {t.strip().removeprefix("W/") for t in ifNoneMatch.split(",")}
+        ):
+            self.writeHead(writer, 304, respHeaders, keepAlive)
+            return keepAlive
+
+        (status, start, count) = (200, 0, size)
+        ifRange = headers.get("if-range", None)
+
+        if rangeSpec is not None and (ifRange is None or ifRange == etag):
+            match = RANGE_RE.match(rangeSpec.replace(" ", ""))
+
+            if match:
+                (first, last) = match.group(1, 2)
+
+                if first:
+                    start = int(first)
+                    end = min(int(last), size - 1) if last else size - 1
+                elif last:
+                    start = max(size - int(last), 0)
+                    end = size - 1
+                else:
+                    (start, end) = (size, -1)
+
+                if start >= size or end < start:
+                    self.writeError(
+                        writer,
+                        416,
+                        keepAlive,
+                        headers={"Content-Range": f"bytes */{size}"},
+                    )
+                    return keepAlive
+
+                status = 206
+                count = end - start + 1
+                respHeaders["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+        respHeaders["Content-Length"] = count
+        self.writeHead(writer, status, respHeaders, keepAlive)
+
+        if method == "GET" and count:
+            await writer.drain()
+
+            with open(path, "rb") as fh:
+                await asyncio.get_running_loop().sendfile(
+                    writer.transport, fh, start, count
+                )
+
+        return keepAlive
+
+
+async def serve(root, host, port, maxAge):
+    server = StaticServer(root, maxAge=maxAge)
+    listener = await asyncio.start_server(server.handle, host, port)
+    # the url must not be normalised as a path, as `console()` does
+    sys.stdout.write(f"Serving {ux(root)} on http://{host}:{port}/\n")
+    sys.stdout.flush()
+
+    async with listener:
+        await listener.serve_forever()
+
+
+def main():
+    baseDir = dirNm(dirNm(abspath(__file__)))
+    cfg = readYaml(asFile=f"{baseDir}/{CONFIG_FILE}")
+    serveSettings = cfg.serve or AttrDict()
+
+    parser = ArgumentParser(description="Serve the Pure3D static site")
+    parser.add_argument(
+        "root",
+        nargs="?",
+        default=ex(cfg.locations.dataOut),
+        help="the directory to serve, by default the dist tree",
+    )
+    parser.add_argument("--host", default=serveSettings.host or "127.0.0.1")
+    parser.add_argument("--port", type=int, default=serveSettings.port or 8050)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(
+            serve(args.root, args.host, args.port, serveSettings.maxAge or 31536000)
+        )
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
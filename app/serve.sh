@@ -1,4 +1,3 @@
 #!/bin/sh
 
-cd ~/local/pure3d/client/dist
-python -m http.server 8050
+python serve.py "$@"
@@ -7,11 +7,22 @@ from urllib.request import urlopen
 from shutil import copyfileobj
 import certifi
 from helpers import console, run
-from files import fileExists
+from files import (
+    fileExists,
+    fileHash,
+    dirAllFiles,
+    dirMake,
+    dirNm,
+    readJson,
+    writeJson,
+    textHash,
+)
 
 
 TAILWIND_VERSION = "v3.3.5"
 
+STATE_FILE = "tailwind.json"
+
 TARGETS = dict(
     amd64="{}-x64",
     x86_64="{}-x64",
@@ -31,13 +42,14 @@ class Tailwind:
     def __init__(self, locations, configFile):
         self.locations = locations
         self.configFile = configFile
+        self.contentDirs = [locations.partialsIn, locations.templates, locations.js]
 
     def install(self):
         locations = self.locations
         baseDir = locations.baseDir
         localDir = locations.localDir
         configFile = self.configFile
-        distDirs = [locations.partialsIn, locations.templates, locations.js]
+        distDirs = self.contentDirs
 
         configInPath = f"{baseDir}/{configFile}"
         configOutPath = f"{localDir}/{configFile}"
@@ -69,31 +81,58 @@ class Tailwind:
             os.chmod(binPath, os.stat(binPath).st_mode | stat.S_IEXEC)
             console("done")
 
-        if True or not fileExists(configOutPath):
-            with open(configInPath) as fh:
-                text = fh.read()
+        with open(configInPath) as fh:
+            text = fh.read()
+
+        contentRe = re.compile(r"""\b(content:\s*\[).*?(\],)""")
+
+        fileSpecs = [(f"{distDir}/**/*." + "{html,js}") for distDir in distDirs]
 
-            contentRe = re.compile(r"""\b(content:\s*\[).*?(\],)""")
+        fileSpecRep = ", ".join(f'"{fileSpec}"' for fileSpec in fileSpecs)
 
-            fileSpecs = [
-                (f"{distDir}/**/*." + "{html,js}") for distDir in distDirs
-            ]
+        def contentRepl(match):
+            (pre, post) = match.group(1, 2)
 
-            fileSpecRep = ", ".join(f'"{fileSpec}"' for fileSpec in fileSpecs)
+            return f"""{pre}{fileSpecRep}{post}"""
 
-            def contentRepl(match):
-                (pre, post) = match.group(1, 2)
+        text = contentRe.sub(contentRepl, text)
 
-                return f"""{pre}{fileSpecRep}{post}"""
+        # only write the config if it changes, so that its mtime stays put
+        if fileExists(configOutPath):
+            with open(configOutPath) as fh:
+                if fh.read() == text:
+                    return
 
-            text = contentRe.sub(contentRepl, text)
+        with open(configOutPath, "w") as fh:
+            fh.write(text)
+
+    def fingerprint(self):
+        """A hash of all inputs of the css generation.
+
+        These are: the tailwind version, the input css, the config, the output path,
+        and the contents of the html and js files that tailwind scans for classes.
+        """
+        locations = self.locations
+        cfgOut = f"{locations.localDir}/{self.configFile}"
+        parts = [TAILWIND_VERSION, locations.cssOut]
 
-            with open(configOutPath, "w") as fh:
-                fh.write(text)
+        for path in (locations.cssIn, cfgOut):
+            parts.append(f"{path}={fileHash(path) if fileExists(path) else ''}")
+
+        for contentDir in self.contentDirs:
+            for path in sorted(dirAllFiles(contentDir)):
+                if path.endswith((".html", ".js")):
+                    parts.append(f"{path}={fileHash(path)}")
+
+        return textHash("\n".join(parts))
 
     def generate(self, verbose=False):
         """Generate the css file.
 
+        If none of the inputs has changed since the previous time,
+        see `fingerprint()`, and the css file is still there, we leave it as is,
+        without running tailwind.
+
         Issues:
 
         The following CSS definitions are found in the content of `_dist`,
@@ -158,10 +197,26 @@ class Tailwind:
         cfgOut = f"{localDir}/{configFile}"
         cssIn = locations.cssIn
         cssOut = locations.cssOut
+        statePath = f"{locations.buildDir}/{STATE_FILE}"
+        fingerprint = self.fingerprint()
+
+        if (
+            fileExists(cssOut)
+            and readJson(asFile=statePath, plain=True).get("fingerprint")
+            == fingerprint
+        ):
+            console(f"{'tailwind':<10} {'css':<12} {'unchanged':<24} in {cssOut}")
+            return True
+
         cmdLine = f"""{binPath}  -c {cfgOut} -i {cssIn} -o {cssOut}"""
         good, stdOut, stdErr = run(cmdLine)
         if verbose or not good:
             console(stdOut)
             console(stdErr)
         console(f"{'tailwind':<10} {'css':<12} {'':<24} to {cssOut}")
+
+        if good:
+            dirMake(dirNm(statePath))
+            writeJson(dict(fingerprint=fingerprint), asFile=statePath)
+
         return good
@@ -0,0 +1,138 @@
+/*
+Chooses the viewer and version of an edition page in the browser.
+
+This is used when the build makes a single page per edition
+(`editionVariants: false` in config.yaml).
+The viewer and version are taken from the query string:
+
+  /project/1/edition/2/index.html?viewer=voyager&version=0.36.0
+
+and default to the ones given by the build.
+
+HTML structure:
+
+<head>
+  <script
+    src="/js/viewer-switch.js"
+    data-manifest="/viewers.json"
+    data-viewer="{defaultViewer}"
+    data-version="{defaultVersion}"
+  ></script>
+</head>
+
+<div
+  id="viewerSlot"
+  data-root="{root of the edition files}"
+  data-document="{scene file}"
+  data-orig-viewer="{viewer}"
+  data-orig-version="{version}"
+></div>
+
+<div id="viewerSelector"></div>
+
+-------------------------------------------
+*/
+
+const viewerSwitch = document.currentScript
+
+const addToHead = (tag, attributes) => {
+  const elem = document.createElement(tag)
+
+  for (const [name, value] of Object.entries(attributes)) {
+    elem.setAttribute(name, value)
+  }
+
+  document.head.appendChild(elem)
+}
+
+const chooseViewer = (viewers, defaults) => {
+  const params = new URLSearchParams(window.location.search)
+  const wantViewer = params.get("viewer") || defaults.viewer
+  const wantVersion = params.get("version") || defaults.version
+
+  const viewer =
+    viewers.find(vw => vw.name == wantViewer) ||
+    viewers.find(vw => vw.name == defaults.viewer)
+
+  if (!viewer) {
+    return [null, null]
+  }
+
+  const version =
+    viewer.versions.find(vv => vv.name == wantVersion) ||
+    viewer.versions.find(vv => vv.isDefault) ||
+    viewer.versions[0]
+
+  return [viewer, version]
+}
+
+// the same html as genViewerSelector() in app/helpers.py
+const selectorHtml = (viewers, chosenViewer, chosenVersion, origViewer, origVersion) => {
+  const html = []
+
+  for (const vw of viewers) {
+    let viewerRep = vw.isDefault ? `<b>${vw.name}</b>` : vw.name
+    viewerRep = vw.name == origViewer ? `<i>${viewerRep}</i>` : viewerRep
+    html.push(`<details><summary>${viewerRep}</summary>`)
+
+    for (const vv of vw.versions) {
+      let versionRep = vw.isDefault && vv.isDefault ? `<b>${vv.name}</b>` : vv.name
+      versionRep =
+        vw.name == origViewer && vv.name == origVersion
+          ? `<i>${versionRep}</i>`
+          : versionRep
+      const entry =
+        vw.name == chosenViewer && vv.name == chosenVersion
+          ? `<span>${versionRep}</span>`
+          : `<a href="?viewer=${vw.name}&version=${vv.name}">${versionRep}</a>`
+      html.push(`<div>${entry}</div>`)
+    }
+
+    html.push("</details>")
+  }
+
+  return html.join("\n")
+}
+
+const showViewer = async () => {
+  const defaults = viewerSwitch.dataset
+  const response = await fetch(defaults.manifest)
+  const { viewers } = await response.json()
+  const [viewer, version] = chooseViewer(viewers, defaults)
+  const slot = document.getElementById("viewerSlot")
+
+  if (!viewer || !version || !slot) {
+    return
+  }
+
+  const resourceRoot = `/viewers/${viewer.name}/${version.name}/`
+  addToHead("link", { rel: "stylesheet", href: `${resourceRoot}fonts/fonts.css` })
+  addToHead("link", {
+    rel: "stylesheet",
+    href: `${resourceRoot}css/${viewer.element}.dev.css`,
+  })
+  addToHead("script", { src: `${resourceRoot}js/${viewer.element}.min.js` })
+
+  const { root, document: sceneFile, origViewer, origVersion } = slot.dataset
+  const elem = document.createElement(viewer.element)
+  elem.setAttribute("root", root)
+  elem.setAttribute("resourceroot", resourceRoot)
+  elem.setAttribute("document", sceneFile)
+  elem.setAttribute("id", "viewer3d")
+  elem.setAttribute("style", slot.getAttribute("style"))
+  slot.replaceWith(elem)
+
+  const selector = document.getElementById("viewerSelector")
+
+  if (selector) {
+    selector.innerHTML = selectorHtml(
+      viewers,
+      viewer.name,
+      version.name,
+      origViewer,
+      origVersion
+    )
+  }
+}
+
+document.addEventListener("DOMContentLoaded", showViewer)
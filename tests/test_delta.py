@@ -0,0 +1,50 @@
+import os
+import json
+
+from delta import Delta
+
+
+def writeFile(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, "w") as fh:
+        fh.write(text)
+
+
+def test_journal_after_aborted_build(tmp_path):
+    dataOutDir = f"{tmp_path}/dist"
+    indexPath = f"{tmp_path}/build/dist.json"
+    changesPath = f"{tmp_path}/build/delta.json"
+    writeFile(f"{dataOutDir}/index.html", "home")
+    writeFile(f"{dataOutDir}/project/1/index.html", "project")
+
+    delta = Delta(dataOutDir, indexPath)
+    delta.save(changesPath)
+
+    # a build that writes and deletes files, but stops before save()
+    delta = Delta(dataOutDir, indexPath)
+    writeFile(f"{dataOutDir}/index.html", "new home")
+    delta.log("write", f"{dataOutDir}/index.html", 8)
+    writeFile(f"{dataOutDir}/project/2/index.html", "project 2")
+    delta.log("write", f"{dataOutDir}/project/2/index.html", 9)
+    os.remove(f"{dataOutDir}/project/1/index.html")
+    delta.log("delete", f"{dataOutDir}/project/1/index.html", 0)
+    delta.journal.close()
+
+    assert os.path.exists(f"{indexPath}.pending")
+
+    # the next build changes nothing itself
+    delta = Delta(dataOutDir, indexPath)
+    changes = delta.save(changesPath)
+
+    assert [f["path"] for f in changes["modified"]] == ["index.html"]
+    assert [f["path"] for f in changes["added"]] == ["project/2/index.html"]
+    assert [f["path"] for f in changes["deleted"]] == ["project/1/index.html"]
+    assert not os.path.exists(f"{indexPath}.pending")
+
+    with open(changesPath) as fh:
+        assert json.load(fh)["added"] == changes["added"]
+
+    # and the build after that has nothing left to report
+    changes = Delta(dataOutDir, indexPath).save(changesPath)
+    assert changes == dict(added=[], modified=[], deleted=[])
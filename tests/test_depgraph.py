@@ -0,0 +1,74 @@
+import os
+
+from depgraph import DepGraph
+from generic import AttrDict
+
+
+def writeFile(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, "w") as fh:
+        fh.write(text)
+
+
+def makeGraph(tmp_path, full=False):
+    return DepGraph(
+        f"{tmp_path}/build/graph.json",
+        f"{tmp_path}/dist",
+        f"{tmp_path}/templates",
+        f"{tmp_path}/partials",
+        "cfg",
+        full=full,
+    )
+
+
+def renderPages(graph, target, fileNames):
+    """Render pages as a build would, returns the names of the rendered pages."""
+    rendered = []
+
+    for fileName in fileNames:
+        item = AttrDict(template="edition.html", fileName=fileName, name="e")
+        deps = graph.key(item)
+        path = f"{graph.dataOutDir}/{fileName}"
+
+        if not graph.isFresh(fileName, deps, [path]):
+            writeFile(path, "page")
+            rendered.append(fileName)
+
+        graph.record(target, fileName, deps)
+
+    return rendered
+
+
+def test_stale_and_missing_pages(tmp_path):
+    writeFile(f"{tmp_path}/templates/edition.html", "{{> head}}{{name}}")
+    writeFile(f"{tmp_path}/partials/head.html", "<head/>")
+    variants = [
+        "project/1/edition/1/index-voyager-1.html",
+        "project/1/edition/1/index-voyager-2.html",
+    ]
+    other = "project/2/edition/1/index.html"
+
+    graph = makeGraph(tmp_path)
+    assert renderPages(graph, "editionpages", variants + [other]) == variants + [other]
+    graph.save()
+
+    # nothing changed, but an output file has been removed by hand
+    os.remove(f"{tmp_path}/dist/{variants[1]}")
+    graph = makeGraph(tmp_path)
+    assert renderPages(graph, "editionpages", variants + [other]) == variants[1:]
+    assert graph.stale("editionpages", set(variants + [other])) == []
+    graph.save()
+
+    # the edition gets a single page: its variant pages are stale,
+    # the pages of editions that are not built now are left alone
+    single = "project/1/edition/1/index.html"
+    graph = makeGraph(tmp_path)
+    assert renderPages(graph, "editionpages", [single]) == [single]
+    assert graph.stale("editionpages", {single}) == variants
+    assert graph.stale("projectpages", {single}) == []
+
+    # a full build renders everything again, but still knows the stale pages
+    graph = makeGraph(tmp_path, full=True)
+    assert renderPages(graph, "editionpages", variants) == variants
+    assert graph.stale("editionpages", {single}) == variants
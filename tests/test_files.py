@@ -0,0 +1,161 @@
+import os
+import json
+import random
+
+import pytest
+
+from files import dirUpdate, JsonRecords, AtomicFile
+from generic import deepdict
+
+
+def makeTree(root, rnd, depth=0):
+    os.makedirs(root, exist_ok=True)
+
+    for name in rnd.sample("abcdef", rnd.randint(0, 5)):
+        if depth < 2 and rnd.random() < 0.4:
+            makeTree(f"{root}/{name}", rnd, depth + 1)
+        else:
+            with open(f"{root}/{name}", "w") as fh:
+                fh.write(str(rnd.random()))
+
+
+def snapshot(root):
+    result = {}
+
+    for dirPath, dirNames, fileNames in os.walk(root):
+        for name in fileNames:
+            with open(f"{dirPath}/{name}") as fh:
+                result[os.path.relpath(f"{dirPath}/{name}", root)] = fh.read()
+
+        for name in dirNames:
+            result[os.path.relpath(f"{dirPath}/{name}", root) + "/"] = None
+
+    return result
+
+
+def syncBoth(tmp_path, build):
+    """Syncs the same pair of trees serially and with threads."""
+    results = []
+
+    for workers in (None, 8):
+        base = tmp_path / f"workers{workers}"
+        build(f"{base}/src", f"{base}/dst")
+        outcome = dirUpdate(f"{base}/src", f"{base}/dst", workers=workers)
+        results.append((outcome, snapshot(f"{base}/dst")))
+
+    return results
+
+
+def test_file_replaced_by_dir(tmp_path):
+    def build(src, dst):
+        os.makedirs(f"{src}/item")
+        os.makedirs(f"{dst}/other")
+
+        for path in (f"{src}/item/a", f"{dst}/item", f"{dst}/other/b"):
+            with open(path, "w") as fh:
+                fh.write(os.path.basename(path))
+
+    (serial, threaded) = syncBoth(tmp_path, build)
+
+    assert serial == threaded
+    assert serial[0][0] is True
+    assert serial[1] == {"item/": None, "item/a": "a"}
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_threaded_equals_serial(tmp_path, seed):
+    def build(src, dst):
+        rnd = random.Random(seed)
+        makeTree(src, rnd)
+        makeTree(dst, rnd)
+
+    (serial, threaded) = syncBoth(tmp_path, build)
+
+    assert serial == threaded
+    assert serial[1].keys() == snapshot(f"{tmp_path}/workersNone/src").keys()
+
+
+RECORDS = [
+    {"_id": 1, "projectId": {"$oid": "p1"}, "title": "plain"},
+    {"_id": 2, "projectId": {"$oid": "p2"}, "title": "café € \U0001f600"},
+    {"_id": 3, "projectId": {"$oid": "p1"}, "title": 'braces {in} [a] "string" }'},
+    {"_id": 4, "projectId": {"$oid": "p2"}, "nested": {"a": [{"b": "}{"}]}},
+]
+
+
+def writeRecords(path, records, indent=None):
+    with open(path, "w", encoding="utf8") as fh:
+        json.dump(records, fh, ensure_ascii=False, indent=indent)
+
+
+def checkRecords(path, records, chunkSize):
+    jr = JsonRecords(path, groupBy=("projectId", "$oid"), chunkSize=chunkSize)
+
+    assert len(jr) == len(records)
+    assert [deepdict(r) for r in jr] == records
+    assert [deepdict(jr.read(span)) for span in jr.spans] == records
+
+    for pId in ("p1", "p2"):
+        assert [deepdict(r) for r in jr.group(pId)] == [
+            r for r in records if r["projectId"]["$oid"] == pId
+        ]
+
+
+@pytest.mark.parametrize("chunkSize", [1, 2, 3, 5, 7, 16, 1 << 16])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_records_across_chunks(tmp_path, chunkSize, indent):
+    """Records span chunk boundaries, also within multibyte characters."""
+    path = f"{tmp_path}/edition.json"
+    writeRecords(path, RECORDS, indent=indent)
+    checkRecords(path, RECORDS, chunkSize)
+
+
+def test_multibyte_at_boundary(tmp_path):
+    path = f"{tmp_path}/edition.json"
+    records = [{"projectId": {"$oid": "p1"}, "title": "€" * 20}]
+    writeRecords(path, records)
+    size = len(open(path, "rb").read())
+
+    for chunkSize in range(1, size + 1):
+        checkRecords(path, records, chunkSize)
+
+
+@pytest.mark.parametrize("text", ["[]", "[ ]", " [\n]\n"])
+def test_empty_array(tmp_path, text):
+    path = f"{tmp_path}/edition.json"
+
+    with open(path, "w") as fh:
+        fh.write(text)
+
+    jr = JsonRecords(path, groupBy=("projectId", "$oid"), chunkSize=1)
+    assert len(jr) == 0
+    assert list(jr) == []
+    assert jr.groups == {}
+
+
+def test_missing_file(tmp_path):
+    assert len(JsonRecords(f"{tmp_path}/edition.json")) == 0
+
+
+def test_atomic_file(tmp_path):
+    path = f"{tmp_path}/index.json"
+
+    with AtomicFile(path) as fh:
+        fh.write("old")
+
+    # a failed write leaves the previous version
+    with pytest.raises(ValueError):
+        with AtomicFile(path) as fh:
+            fh.write("half")
+            raise ValueError
+
+    af = AtomicFile(path, "wb")
+
+    with af as fh:
+        fh.write(b"discarded")
+        af.discard()
+
+    with open(path) as fh:
+        assert fh.read() == "old"
+
+    assert os.listdir(tmp_path) == ["index.json"]
@@ -0,0 +1,59 @@
+import os
+import json
+
+from idmap import IdMap
+
+
+def writeId(path, objectId):
+    os.makedirs(path, exist_ok=True)
+
+    with open(f"{path}/id.json", "w") as fh:
+        json.dump(dict(id=objectId), fh)
+
+
+def test_migrate_from_id_files(tmp_path):
+    projectOutDir = f"{tmp_path}/project"
+    writeId(f"{projectOutDir}/1", "pa")
+    writeId(f"{projectOutDir}/1/edition/1", "ea")
+    writeId(f"{projectOutDir}/1/edition/3", "eb")
+    writeId(f"{projectOutDir}/2", "pb")
+    os.makedirs(f"{projectOutDir}/notanumber")
+
+    idMap = IdMap(f"{projectOutDir}/ids.json", projectOutDir)
+
+    assert idMap.changed
+    assert idMap.projects == dict(pa=1, pb=2)
+    assert idMap.editions == dict(pa=dict(ea=1, eb=3), pb={})
+
+    idMap.save()
+    assert not idMap.changed
+
+    # the mapping survives the removal of the id.json files by the sync
+    for dirPath, dirNames, fileNames in os.walk(projectOutDir):
+        if "id.json" in fileNames:
+            os.remove(f"{dirPath}/id.json")
+
+    idMap = IdMap(f"{projectOutDir}/ids.json", projectOutDir)
+
+    assert not idMap.changed
+    assert idMap.project("pa") == 1
+    assert idMap.edition("pa", "eb") == 3
+    assert idMap.edition("pa", "ec") == 4
+    assert idMap.project("pc") == 3
+    assert idMap.changed
+
+
+def test_new_numbers_after_directories(tmp_path):
+    """Without a mapping, new numbers do not reuse numbered directories."""
+    projectOutDir = f"{tmp_path}/project"
+    os.makedirs(f"{projectOutDir}/1/edition/5")
+    os.makedirs(f"{projectOutDir}/7")
+
+    idMap = IdMap(f"{projectOutDir}/ids.json", projectOutDir)
+
+    assert idMap.projects == {}
+    assert idMap.project("pa") == 8
+    assert idMap.edition("pa", "ea") == 1
+
+    idMap.projects["pb"] = 1
+    assert idMap.edition("pb", "eb") == 6